@@ -0,0 +1,76 @@
+"""Бенчмарк авторизации API: Basic (проверка пароля на каждый запрос) против токена с кэшем.
+
+Запросы GET /api/companies/ проходят через весь стек Django (middleware, DRF, права).
+Хэшер паролей - по умолчанию Django (как в production), независимо от настроек окружения.
+Пользователь и компания создаются в транзакции, которая в конце откатывается.
+
+    $ docker-compose -f local.yml run --rm django python benchmarks/api_authentication.py --requests 200
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
+django.setup()
+
+from django.conf import global_settings  # noqa E402
+from django.contrib.auth import get_user_model  # noqa E402
+from django.db import connection, transaction  # noqa E402
+from django.test import Client, override_settings  # noqa E402
+from django.test.utils import CaptureQueriesContext  # noqa E402
+from rest_framework.authtoken.models import Token  # noqa E402
+
+from credit_project.loans.models import Company  # noqa E402
+
+PASSWORD = 'benchmark-password'
+
+
+class Rollback(Exception):
+    pass
+
+
+def run(client, authorization, requests):
+    for _ in range(requests):
+        response = client.get('/api/companies/', HTTP_AUTHORIZATION=authorization)
+        assert response.status_code == 200, response.status_code
+
+
+@override_settings(PASSWORD_HASHERS=global_settings.PASSWORD_HASHERS, ALLOWED_HOSTS=['*'])
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    try:
+        with transaction.atomic():
+            user = get_user_model().objects.create_user('authentication-benchmark', password=PASSWORD)
+            Company.objects.create(name='partner', kind=Company.KIND.partner, user=user)
+            token = Token.objects.create(user=user)
+            basic = base64.b64encode('{}:{}'.format(user.username, PASSWORD).encode('utf-8')).decode('ascii')
+
+            client = Client()
+            print('Хэшер паролей: {}'.format(user.password.split('$', 1)[0]))
+            for name, authorization in (('Basic', 'Basic ' + basic), ('Token', 'Token ' + token.key)):
+                # Первый запрос заполняет кэши роли и токена
+                run(client, authorization, 1)
+                with CaptureQueriesContext(connection) as queries:
+                    run(client, authorization, 10)
+                # Лог запросов к БД очищается в начале каждого HTTP-запроса, считаем сразу
+                query_count = len(queries)
+                started = time.perf_counter()
+                run(client, authorization, args.requests)
+                elapsed = time.perf_counter() - started
+                print('{:<6} {:.0f} запросов/с, {:.2f} мс на запрос, запросов к БД на запрос: {:.1f}'.format(
+                    name, args.requests / elapsed, elapsed / args.requests * 1000, query_count / 10))
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
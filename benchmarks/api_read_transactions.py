@@ -0,0 +1,107 @@
+"""Бенчмарк чтения API без транзакции запроса (NonAtomicReadMixin) против прежнего поведения.
+
+GET списков и детальной информации всех вьюсетов проходят через весь стек Django (ATOMIC_REQUESTS,
+middleware, DRF). Прежнее поведение - чтение в транзакции, как у изменяющих запросов.
+Чтение идет без транзакции только вне внешней транзакции, поэтому данные для замера
+коммитятся перед ним и удаляются в конце.
+
+    $ docker-compose -f local.yml run --rm django python benchmarks/api_read_transactions.py --requests 2000
+"""
+import argparse
+import os
+import sys
+import time
+from unittest import mock
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa E402
+from django.db import connection  # noqa E402
+from django.test import Client, override_settings  # noqa E402
+from django.utils import timezone  # noqa E402
+
+from credit_project.loans.models import Borrower, Company, CreditRequest, Offer  # noqa E402
+
+
+def get(client, url):
+    started = time.perf_counter()
+    response = client.get(url)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 200, response.status_code
+    return elapsed
+
+
+def measure(client, urls, requests):
+    """Запросы в транзакции и без нее чередуются, чтобы прогрев и фоновая нагрузка
+    одинаково влияли на оба варианта. Возвращает суммарное время каждого варианта.
+    """
+    # Без SAFE_METHODS миксин выполняет в транзакции все запросы, как раньше
+    atomic_reads = mock.patch('credit_project.api.views.mixins.SAFE_METHODS', ())
+    atomic_elapsed = elapsed = 0
+    for index in range(requests):
+        url = urls[index % len(urls)]
+        atomic_reads.start()
+        try:
+            atomic_elapsed += get(client, url)
+        finally:
+            atomic_reads.stop()
+        elapsed += get(client, url)
+    return atomic_elapsed, elapsed
+
+
+def create_data(user):
+    now = timezone.now()
+    company = Company.objects.create(name='partner', kind=Company.KIND.partner, user=user)
+    borrower = Borrower.objects.create(company=company, last_name='Фамилия', first_name='Имя',
+                                       middle_name='Отчество', birth_date=now.date(),
+                                       phone_number='+79990000000', passport_number='0000000000', score=500)
+    # Подбор заявок по новому предложению для замера не нужен
+    with mock.patch('credit_project.loans.signals.enqueue'):
+        offer = Offer.objects.create(company=company, name='offer', kind=Offer.KIND.consumer_credit,
+                                     min_score=0, max_score=1000,
+                                     rotation_start=now, rotation_end=now + timezone.timedelta(days=1))
+    credit_request = CreditRequest.objects.create(borrower=borrower, offer=offer)
+    return ['/api/borrowers/', '/api/borrowers/{}/'.format(borrower.id),
+            '/api/companies/', '/api/companies/{}/'.format(company.id),
+            '/api/credit-requests/', '/api/credit-requests/{}/'.format(credit_request.id),
+            '/api/offers/', '/api/offers/{}/'.format(offer.id)]
+
+
+def delete_data(user):
+    CreditRequest.objects.filter(borrower__company__user=user).delete()
+    Borrower.objects.filter(company__user=user).delete()
+    with mock.patch('credit_project.loans.signals.enqueue'):
+        Offer.objects.filter(company__user=user).delete()
+    Company.objects.filter(user=user).delete()
+    user.delete()
+
+
+@override_settings(ALLOWED_HOSTS=['*'])
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--conn-max-age', type=int, default=60,
+                        help='CONN_MAX_AGE: постоянное соединение, как с пулом соединений')
+    args = parser.parse_args()
+    connection.settings_dict['CONN_MAX_AGE'] = args.conn_max_age
+
+    user = get_user_model().objects.create_user('read-transactions-benchmark', is_superuser=True)
+    try:
+        urls = create_data(user)
+        client = Client()
+        client.force_login(user)
+        measure(client, urls, len(urls))
+        atomic_elapsed, elapsed = measure(client, urls, args.requests)
+        for name, total in (('в транзакции', atomic_elapsed), ('без транзакции', elapsed)):
+            print('{:<15} {:.3f} мс на запрос'.format(name, total / args.requests * 1000))
+        print('Экономия: {:.3f} мс на запрос'.format((atomic_elapsed - elapsed) / args.requests * 1000))
+    finally:
+        delete_data(user)
+
+
+if __name__ == '__main__':
+    main()
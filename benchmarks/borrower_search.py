@@ -0,0 +1,108 @@
+"""Бенчмарк поиска анкет: icontains по пяти полям против полнотекстового индекса по ФИО.
+
+Анкеты генерируются в БД одним INSERT ... SELECT generate_series внутри транзакции,
+которая в конце откатывается, поэтому данные в базе не остаются.
+
+    $ docker-compose -f local.yml run --rm django python benchmarks/borrower_search.py --borrowers 5000000
+"""
+import argparse
+import os
+import sys
+import time
+from functools import reduce
+import operator
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa E402
+from django.db import connection, transaction  # noqa E402
+from django.db.models import Q  # noqa E402
+from django.test import RequestFactory  # noqa E402
+from rest_framework.request import Request  # noqa E402
+
+from credit_project.api.filters import FullTextSearchFilter  # noqa E402
+from credit_project.api.views.borrower import BorrowerViewSet  # noqa E402
+from credit_project.loans.models import Borrower, Company  # noqa E402
+
+GENERATE_SQL = '''
+INSERT INTO loans_borrower (created, modified, last_name, first_name, middle_name, birth_date,
+                            phone_number, passport_number, score, company_id)
+SELECT now(), now(),
+       'Фамилия' || translate((i %% 100000)::text, '0123456789', %s),
+       'Имя' || translate((i %% 1000)::text, '0123456789', %s),
+       'Отчество' || translate((i %% 5000)::text, '0123456789', %s),
+       date '1960-01-01' + i %% 15000,
+       '+7999' || lpad(i::text, 7, '0'), lpad(i::text, 10, '0'), i %% 1000, %s
+FROM generate_series(1, %s) AS i
+'''
+
+# Цифры в ФИО заменяются буквами: слова с цифрами поиск считает номерами
+LETTERS = 'абвгдежзик'
+
+OLD_SEARCH_FIELDS = ('last_name', 'first_name', 'middle_name', 'phone_number', 'passport_number')
+
+
+class Rollback(Exception):
+    pass
+
+
+def word(prefix, number):
+    return prefix + str(number).translate(str.maketrans('0123456789', LETTERS))
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.perf_counter() - started) / repeat
+
+
+def icontains_search(terms):
+    queryset = Borrower.objects.all()
+    for term in terms:
+        queryset = queryset.filter(reduce(operator.or_, (Q(**{field + '__icontains': term})
+                                                         for field in OLD_SEARCH_FIELDS)))
+    return queryset
+
+
+def full_text_search(terms):
+    request = Request(RequestFactory().get('/', {'search': ' '.join(terms)}))
+    return FullTextSearchFilter().filter_queryset(request, Borrower.objects.all(), BorrowerViewSet())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--borrowers', type=int, default=5000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=100)
+    args = parser.parse_args()
+
+    queries = [[word('Фамилия', 12345)], [word('Фамилия', 1234), word('Имя', 234)], [word('Отчество', 49)]]
+    try:
+        with transaction.atomic():
+            user = get_user_model().objects.create(username='borrower-search-benchmark')
+            company = Company.objects.create(name='benchmark', user=user, kind=Company.KIND.partner)
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(GENERATE_SQL, [LETTERS] * 3 + [company.id, args.borrowers])
+                cursor.execute('ANALYZE loans_borrower')
+            print('Анкет: {}, генерация: {:.1f} с'.format(args.borrowers, time.perf_counter() - started))
+
+            for terms in queries:
+                print('Запрос: {}'.format(' '.join(terms)))
+                for name, search in (('icontains', icontains_search), ('tsvector', full_text_search)):
+                    page, page_time = timed(lambda: list(search(terms)[:args.page_size]), args.repeat)
+                    count, count_time = timed(lambda: search(terms).count(), args.repeat)
+                    print('  {:<10} страница: {:.4f} с, count: {:.4f} с ({} анкет)'.format(
+                        name, page_time, count_time, count))
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""Бенчмарк потоковой выгрузки заявок КО (GET /api/credit-requests/export/).
+
+Анкеты и заявки генерируются в БД INSERT ... SELECT generate_series внутри транзакции,
+которая в конце откатывается. Ответ вьюсета читается целиком, измеряются время
+и прирост пикового RSS процесса; с --compare-list для сравнения строки той же выборки
+загружаются списком, как без серверного курсора (после выгрузок, т.к. пик RSS не убывает).
+
+    $ docker-compose -f local.yml run --rm django python benchmarks/credit_request_export.py --borrowers 1000000 --offers 10
+"""
+import argparse
+import os
+import sys
+import resource
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa E402
+from django.db import connection, transaction  # noqa E402
+from django.utils import timezone  # noqa E402
+from rest_framework.test import APIRequestFactory, force_authenticate  # noqa E402
+
+from credit_project.api.views import CreditRequestViewSet  # noqa E402
+from credit_project.loans.models import Company, CreditRequest, Offer  # noqa E402
+
+GENERATE_BORROWERS_SQL = '''
+INSERT INTO loans_borrower (created, modified, last_name, first_name, middle_name, birth_date,
+                            phone_number, passport_number, score, company_id)
+SELECT now(), now(), 'Фамилия', 'Имя', 'Отчество', date '1960-01-01' + i %% 15000,
+       '+7999' || lpad(i::text, 7, '0'), lpad(i::text, 10, '0'), i %% 1000, %s
+FROM generate_series(1, %s) AS i
+'''
+
+GENERATE_CREDIT_REQUESTS_SQL = '''
+INSERT INTO loans_creditrequest (status, created, modified, borrower_id, offer_id,
+                                 borrower_company_id, offer_company_id)
+SELECT 'new', now(), now(), b.id, o.id, b.company_id, o.company_id
+FROM loans_borrower b CROSS JOIN loans_offer o
+WHERE b.company_id = %s AND o.company_id = %s
+'''
+
+
+class Rollback(Exception):
+    pass
+
+
+def export(user, file_format):
+    request = APIRequestFactory().get('/api/credit-requests/export/', {'file_format': file_format})
+    force_authenticate(request, user=user)
+    response = CreditRequestViewSet.as_view({'get': 'export'})(request)
+    size = 0
+    for chunk in response.streaming_content:
+        size += len(chunk)
+    return size
+
+
+def measure(func, *args):
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - started
+    # ru_maxrss в Linux - в килобайтах
+    return result, elapsed, (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - max_rss) * 1024
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--borrowers', type=int, default=1000000)
+    parser.add_argument('--offers', type=int, default=10)
+    parser.add_argument('--compare-list', action='store_true')
+    args = parser.parse_args()
+
+    User = get_user_model()
+    try:
+        with transaction.atomic():
+            partner = Company.objects.create(name='partner', kind=Company.KIND.partner,
+                                             user=User.objects.create(username='export-benchmark-p'))
+            co_user = User.objects.create(username='export-benchmark-co')
+            co = Company.objects.create(name='co', kind=Company.KIND.credit_organization, user=co_user)
+            for i in range(args.offers):
+                Offer.objects.create(name='offer {}'.format(i), company=co, kind=Offer.KIND.consumer_credit,
+                                     rotation_start=timezone.now(), rotation_end=timezone.now(),
+                                     min_score=0, max_score=1000)
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                cursor.execute(GENERATE_BORROWERS_SQL, [partner.id, args.borrowers])
+                cursor.execute(GENERATE_CREDIT_REQUESTS_SQL, [partner.id, co.id])
+                cursor.execute('ANALYZE loans_creditrequest')
+            rows = CreditRequest.objects.filter(offer_company_id=co.id).count()
+            print('Заявок: {}, генерация: {:.1f} с'.format(rows, time.perf_counter() - started))
+
+            for file_format in ('csv', 'ndjson'):
+                size, elapsed, peak = measure(export, co_user, file_format)
+                print('{:<7} {:.1f} с, {:.0f} строк/с, {:.1f} МБ ответа, прирост памяти {:.1f} МБ'.format(
+                    file_format, elapsed, rows / elapsed, size / 2 ** 20, peak / 2 ** 20))
+
+            if args.compare_list:
+                queryset = CreditRequest.objects.filter(offer_company_id=co.id).values_list(
+                    *(field for _, field in CreditRequestViewSet.export_fields))
+                _, elapsed, peak = measure(list, queryset)
+                print('list()  {:.1f} с, прирост памяти {:.1f} МБ'.format(elapsed, peak / 2 ** 20))
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
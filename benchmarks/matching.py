@@ -0,0 +1,67 @@
+"""Бенчмарк numpy-подбора анкет под предложения.
+
+Анкеты генерируются в памяти (БД не используется), сравнивается поиск по отсортированному
+массиву с полным перебором (булевой маской по всем анкетам).
+
+    $ docker-compose -f local.yml run --rm django python benchmarks/matching.py --borrowers 10000000
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+
+import django
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
+django.setup()
+
+from credit_project.loans.matching import BorrowerScores  # noqa E402
+
+Offer = namedtuple('Offer', ('id', 'min_score', 'max_score'))
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def brute_force(ids, scores, offers):
+    return [(offer.id, ids[(scores >= offer.min_score) & (scores <= offer.max_score)])
+            for offer in offers]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--borrowers', type=int, default=10000000)
+    parser.add_argument('--offers', type=int, default=100)
+    parser.add_argument('--max-score', type=int, default=1000)
+    args = parser.parse_args()
+
+    random = np.random.RandomState(0)
+    ids = np.arange(1, args.borrowers + 1, dtype=np.int32)
+    scores = random.randint(0, args.max_score + 1, size=args.borrowers).astype(np.uint16)
+    min_scores = random.randint(0, args.max_score // 2, size=args.offers)
+    offers = [Offer(offer_id, min_score, min_score + random.randint(1, args.max_score // 2))
+              for offer_id, min_score in enumerate(min_scores, start=1)]
+
+    borrower_scores, build_time = timed(BorrowerScores, ids, scores)
+    pairs, search_time = timed(borrower_scores.eligible_for_offers, offers)
+    brute_pairs, brute_time = timed(brute_force, ids, scores, offers)
+
+    total_pairs = sum(len(borrower_ids) for _, borrower_ids in pairs)
+    assert total_pairs == sum(len(borrower_ids) for _, borrower_ids in brute_pairs)
+
+    print('Анкет: {}, предложений: {}, подходящих пар: {}'.format(args.borrowers, args.offers, total_pairs))
+    print('Память под анкеты: {:.1f} МБ'.format(
+        (borrower_scores.ids.nbytes + borrower_scores.scores.nbytes) / 2 ** 20))
+    print('Сортировка по баллу: {:.3f} с'.format(build_time))
+    print('Поиск по отсортированному массиву: {:.4f} с'.format(search_time))
+    print('Полный перебор: {:.3f} с'.format(brute_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Бенчмарк проверки прав на заявку: прежний набор из шести классов против таблицы прав.
+
+Для каждого "запроса" создается новый объект пользователя (как после загрузки из сессии)
+и выполняются check_permissions и check_object_permissions вьюсета заявок.
+Пользователи и компании создаются в транзакции, которая в конце откатывается.
+
+    $ docker-compose -f local.yml run --rm django python benchmarks/permissions.py --requests 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings.local')
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa E402
+from django.db import connection, transaction  # noqa E402
+from django.test.utils import CaptureQueriesContext  # noqa E402
+from rest_framework import permissions  # noqa E402
+from rest_framework.permissions import IsAuthenticated  # noqa E402
+from rest_framework.request import Request  # noqa E402
+from rest_framework.test import APIRequestFactory  # noqa E402
+
+from credit_project.api.views import CreditRequestViewSet  # noqa E402
+from credit_project.loans.models import Borrower, Company, CreditRequest, Offer  # noqa E402
+
+User = get_user_model()
+
+
+# Прежняя реализация прав заявок
+def old_is_owner(obj, user):
+    check_results = []
+    for owner_field in ['borrower.company.user', 'offer.company.user']:
+        check_obj = obj
+        for field in owner_field.split('.'):
+            check_obj = getattr(check_obj, field)
+        check_results.append(check_obj == user)
+    return any(check_results)
+
+
+def old_is_partner_user(user):
+    return hasattr(user, 'company') and user.company.is_partner
+
+
+def old_is_credit_organization_user(user):
+    return hasattr(user, 'company') and user.company.is_credit_organization
+
+
+class ListForCompanyOrSuperUser(IsAuthenticated):
+    def has_permission(self, request, view):
+        is_authenticated = super().has_permission(request, view)
+        return is_authenticated and (request.user.is_superuser or hasattr(request.user, 'company'))
+
+
+class DetailForOwnerOrSuperUser(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        return request.user.is_superuser or old_is_owner(obj, request.user)
+
+
+class CreateForPartnerOrSuperUser(permissions.BasePermission):
+    def has_permission(self, request, view):
+        if request.method == 'POST':
+            return request.user.is_superuser or old_is_partner_user(request.user)
+        return True
+
+
+class DeleteForSuperUser(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        if request.method == 'DELETE':
+            return request.user.is_superuser
+        return True
+
+
+class EditForOwnerOrSuperUser(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        if request.method in ['PUT', 'PATCH']:
+            return request.user.is_superuser or old_is_owner(obj, request.user)
+        return True
+
+
+class EditForSuperUserOrCreditOrganizationUser(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        if request.method in ['PUT', 'PATCH']:
+            return request.user.is_superuser or old_is_credit_organization_user(request.user)
+        return True
+
+
+class OldCreditRequestViewSet(CreditRequestViewSet):
+    permission_classes = (ListForCompanyOrSuperUser,
+                          DetailForOwnerOrSuperUser,
+                          CreateForPartnerOrSuperUser,
+                          DeleteForSuperUser,
+                          EditForOwnerOrSuperUser,
+                          EditForSuperUserOrCreditOrganizationUser, )
+
+
+class Rollback(Exception):
+    pass
+
+
+def check(viewset_class, method, user_fields, credit_request, requests):
+    factory = APIRequestFactory()
+    http_request = getattr(factory, method.lower())('/api/credit-requests/1/')
+    for _ in range(requests):
+        request = Request(http_request)
+        request.user = User(**user_fields)
+        view = viewset_class(request=request, format_kwarg=None, action='retrieve')
+        view.check_permissions(request)
+        view.check_object_permissions(request, credit_request)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', type=int, default=10000)
+    args = parser.parse_args()
+
+    try:
+        with transaction.atomic():
+            partner = Company.objects.create(name='partner', kind=Company.KIND.partner,
+                                             user=User.objects.create(username='permissions-benchmark-p'))
+            co = Company.objects.create(name='co', kind=Company.KIND.credit_organization,
+                                        user=User.objects.create(username='permissions-benchmark-co'))
+            credit_request = CreditRequest(
+                borrower=Borrower(company=partner), offer=Offer(company=co))
+            credit_request.borrower_company_id = partner.id
+            credit_request.offer_company_id = co.id
+
+            for company, method in ((partner, 'GET'), (co, 'GET'), (co, 'PATCH')):
+                user_fields = {'id': company.user.id, 'username': company.user.username}
+                print('{} {}:'.format(company.kind, method))
+                for name, viewset_class in (('6 классов', OldCreditRequestViewSet),
+                                            ('таблица', CreditRequestViewSet)):
+                    # Первый прогон заполняет кэш ролей
+                    check(viewset_class, method, user_fields, credit_request, 1)
+                    with CaptureQueriesContext(connection) as queries:
+                        check(viewset_class, method, user_fields, credit_request, 100)
+                    started = time.perf_counter()
+                    check(viewset_class, method, user_fields, credit_request, args.requests)
+                    elapsed = time.perf_counter() - started
+                    print('  {:<10} {:.1f} мкс на запрос, запросов к БД на запрос: {:.1f}'.format(
+                        name, elapsed / args.requests * 10 ** 6, len(queries) / 100))
+            raise Rollback
+    except Rollback:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -59,14 +59,16 @@ DJANGO_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.admin',
+    'django.contrib.postgres',
 ]
 THIRD_PARTY_APPS = [
     'django_filters',
     'phonenumber_field',
     'rest_framework',
+    'rest_framework.authtoken',
 ]
 LOCAL_APPS = [
-    'credit_project.api',
+    'credit_project.api.apps.ApiConfig',
     'credit_project.loans',
 ]
 # https://docs.djangoproject.com/en/dev/ref/settings/#installed-apps
@@ -186,14 +188,43 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERYD_TASK_TIME_LIMIT = 5 * 60
 # http://docs.celeryproject.org/en/latest/userguide/configuration.html#task-soft-time-limit
 CELERYD_TASK_SOFT_TIME_LIMIT = 60
+# Batching consumer mode for CreateOfferRequestsTask (see credit_project.loans.tasks).
+# The worker prefetch count (concurrency * prefetch multiplier) should be at least
+# CREDIT_REQUESTS_BATCH_SIZE, otherwise batches are flushed by interval only.
+CREDIT_REQUESTS_BATCH_CONSUMER = env.bool('CREDIT_REQUESTS_BATCH_CONSUMER', default=False)
+CREDIT_REQUESTS_BATCH_SIZE = env.int('CREDIT_REQUESTS_BATCH_SIZE', default=100)
+CREDIT_REQUESTS_BATCH_INTERVAL_MS = env.int('CREDIT_REQUESTS_BATCH_INTERVAL_MS', default=200)
+# Offers saved before their rotation starts are matched by a periodic sweep
+# (credit_project.loans.tasks.MatchStartedOffersTask) rather than by far-future eta messages,
+# which the Redis broker redelivers after visibility_timeout. The lookback is used when
+# the time of the previous sweep is missing from the cache.
+OFFER_ROTATION_SWEEP_INTERVAL = env.int('OFFER_ROTATION_SWEEP_INTERVAL', default=60)
+OFFER_ROTATION_SWEEP_LOOKBACK = env.int('OFFER_ROTATION_SWEEP_LOOKBACK', default=24 * 60 * 60)
+# http://docs.celeryproject.org/en/latest/userguide/periodic-tasks.html
+CELERY_BEAT_SCHEDULE = {
+    'match-started-offers': {
+        'task': 'credit_project.loans.tasks.MatchStartedOffersTask',
+        'schedule': OFFER_ROTATION_SWEEP_INTERVAL,
+    },
+}
+# Credit request fan-out jobs (see credit_project.loans.jobs): record lifetime,
+# long-poll limit of the job status endpoint and how often it rereads the record
+CREDIT_REQUEST_JOB_TIMEOUT = env.int('CREDIT_REQUEST_JOB_TIMEOUT', default=24 * 60 * 60)
+CREDIT_REQUEST_JOB_MAX_WAIT = env.int('CREDIT_REQUEST_JOB_MAX_WAIT', default=30)
+CREDIT_REQUEST_JOB_POLL_INTERVAL = env.float('CREDIT_REQUEST_JOB_POLL_INTERVAL', default=0.1)
+# How long an Idempotency-Key of POST /api/credit-requests/ maps to its job, and the window
+# in which repeated submissions for the same borrower and offer are coalesced into one job (0 - off)
+CREDIT_REQUEST_IDEMPOTENCY_TIMEOUT = env.int('CREDIT_REQUEST_IDEMPOTENCY_TIMEOUT', default=24 * 60 * 60)
+CREDIT_REQUEST_COALESCE_WINDOW = env.int('CREDIT_REQUEST_COALESCE_WINDOW', default=60)
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
+        'credit_project.api.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.BasicAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_FILTER_BACKENDS': (
-        'rest_framework.filters.SearchFilter',
+        'credit_project.api.filters.FullTextSearchFilter',
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
     ),
@@ -203,6 +234,17 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
 }
+# Keyset pagination for machine clients (see credit_project.api.pagination)
+CURSOR_PAGINATION_PAGE_SIZE = env.int('CURSOR_PAGINATION_PAGE_SIZE', default=100)
+CURSOR_PAGINATION_MAX_PAGE_SIZE = env.int('CURSOR_PAGINATION_MAX_PAGE_SIZE', default=1000)
+# Upper bound for offer catalog cache entries; they also expire at the next rotation boundary
+OFFER_CATALOG_CACHE_TIMEOUT = env.int('OFFER_CATALOG_CACHE_TIMEOUT', default=60 * 60)
+# User company and role are cached by user id and dropped when the company changes
+USER_ROLE_CACHE_TIMEOUT = env.int('USER_ROLE_CACHE_TIMEOUT', default=24 * 60 * 60)
+# API token -> user and role; dropped when the token is deleted or the user/company changes
+AUTH_TOKEN_CACHE_TIMEOUT = env.int('AUTH_TOKEN_CACHE_TIMEOUT', default=24 * 60 * 60)
+# Max number of credit requests in one bulk status transition
+CREDIT_REQUESTS_TRANSITION_MAX_IDS = env.int('CREDIT_REQUESTS_TRANSITION_MAX_IDS', default=10000)
 
 FIXTURE_DIRS = [
     str(ROOT_DIR.path('fixtures')),
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class ApiConfig(AppConfig):
+    name = 'credit_project.api'
+    verbose_name = 'API'
+
+    def ready(self):
+        from . import signals  # noqa F401
@@ -0,0 +1,98 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import ugettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from credit_project.loans.roles import UserRole, get_user_role
+
+TOKEN_CACHE_KEY = 'api:auth_token:{}'
+# Версия записи токена: меняется при сбросе, запись с другой версией считается устаревшей
+TOKEN_VERSION_CACHE_KEY = 'api:auth_token_version:{}'
+
+# Поля пользователя, которые хранятся в кэше токена; остальные загружаются при обращении
+TOKEN_USER_FIELDS = ('id', 'username', 'is_active', 'is_staff', 'is_superuser')
+
+
+def get_token_cache_keys(key):
+    """Ключи записи и версии токена. В ключах кэша - хэш токена, а не сам токен"""
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    return TOKEN_CACHE_KEY.format(digest), TOKEN_VERSION_CACHE_KEY.format(digest)
+
+
+def build_user(values):
+    """Пользователь из закэшированных полей. Поля не из TOKEN_USER_FIELDS отложены,
+    поэтому save() такого объекта не затрет, например, пароль.
+    """
+    user_model = get_user_model()
+    # from_db ожидает значения в порядке полей модели
+    values = dict(zip(TOKEN_USER_FIELDS, values))
+    return user_model.from_db(DEFAULT_DB_ALIAS, TOKEN_USER_FIELDS, [
+        values[field.attname] for field in user_model._meta.concrete_fields if field.attname in values])
+
+
+def build_token(key, created, user):
+    """Токен для request.auth, как у TokenAuthentication, но без запроса к БД"""
+    token = Token.from_db(DEFAULT_DB_ALIAS, ('key', 'user_id', 'created'), (key, user.pk, created))
+    token.user = user
+    return token
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Авторизация машинных клиентов по токену: заголовок Authorization: Token <key>.
+
+    В отличие от BasicAuthentication пароль (намеренно медленное хэширование) не проверяется,
+    а пользователь вместе с компанией и ролью кэшируется по токену: авторизация запроса -
+    одно обращение к кэшу без запросов к БД. Запись сбрасывается при удалении (отзыве) токена,
+    изменении пользователя и его компании (см. signals).
+
+    Запрос мог прочитать токен из БД до коммита отзыва и записать его в кэш уже после сброса.
+    Поэтому запись хранит версию токена, прочитанную до обращения к БД, а сброс меняет версию:
+    такая запись не совпадет с новой версией и будет прочитана заново.
+    """
+
+    def authenticate_credentials(self, key):
+        cache_key, version_key = get_token_cache_keys(key)
+        cached = cache.get_many([cache_key, version_key])
+        version = cached.get(version_key)
+        record = cached.get(cache_key)
+        if record is None or record[0] != version:
+            row = Token.objects.filter(key=key).values_list(
+                'created', *('user__{}'.format(field) for field in TOKEN_USER_FIELDS)).first()
+            if row is None:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            created, values = row[0], row[1:]
+            record = (version, created, values, tuple(get_user_role(build_user(values))))
+            cache.set(cache_key, record, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+
+        _version, created, values, role = record
+        user = build_user(values)
+        # Роль уже известна, get_user_role не обращается ни к кэшу, ни к БД
+        user._role = UserRole(*role)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, build_token(key, created, user)
+
+
+def reset_token_versions(keys):
+    # Версия живет дольше любой записи, прочитанной до сброса: иначе после вытеснения версии
+    # устаревшая запись снова совпала бы с отсутствующей версией
+    cache.set_many({get_token_cache_keys(key)[1]: uuid.uuid4().hex for key in keys},
+                   settings.AUTH_TOKEN_CACHE_TIMEOUT * 2)
+
+
+def invalidate_token(key):
+    """Сбрасывает закэшированного пользователя токена после коммита текущей транзакции"""
+    transaction.on_commit(lambda: reset_token_versions([key]))
+
+
+def invalidate_user_tokens(user_id):
+    keys = list(Token.objects.filter(user_id=user_id).values_list('key', flat=True))
+    if keys:
+        transaction.on_commit(lambda: reset_token_versions(keys))
@@ -0,0 +1,74 @@
+import hashlib
+from urllib import parse
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import quote_etag
+
+from credit_project.loans.offer_index import offer_index
+
+
+class OfferCatalogCache:
+    """Кэш сериализованного каталога активных предложений.
+
+    Ключ включает версию индекса активных предложений (меняется при сохранении
+    и удалении предложения), адрес сервера (в ответе абсолютные ссылки) и параметры
+    запроса (фильтры kind, company, score, поиск, сортировка, страница).
+    Запись живет до ближайшей границы ротации любого из предложений.
+    """
+    KEY_PREFIX = 'api:offer_catalog'
+    HITS_KEY = KEY_PREFIX + ':hits'
+    MISSES_KEY = KEY_PREFIX + ':misses'
+
+    def get(self, request, now=None):
+        now = now or timezone.now()
+        version, expires_at = offer_index.state(now)
+        entry = cache.get(self.get_key(request, version))
+        # Redis может продержать запись на миллисекунды дольше границы ротации
+        if entry is not None and (entry[0] is None or now < entry[0]):
+            self._count(self.HITS_KEY)
+            return entry[1]
+        self._count(self.MISSES_KEY)
+        return None
+
+    def set(self, request, data, now=None):
+        now = now or timezone.now()
+        version, expires_at = offer_index.state(now)
+        timeout = settings.OFFER_CATALOG_CACHE_TIMEOUT
+        if expires_at is not None:
+            timeout = min(timeout, (expires_at - now).total_seconds())
+        if timeout > 0:
+            cache.set(self.get_key(request, version), (expires_at, data), timeout)
+
+    def get_etag(self, request, now=None):
+        """ETag каталога: меняется вместе с ключом кэша"""
+        version, expires_at = offer_index.state(now or timezone.now())
+        key = '{}:{}'.format(self.get_key(request, version), expires_at)
+        return quote_etag(hashlib.md5(key.encode('utf-8')).hexdigest())
+
+    def get_key(self, request, version):
+        query = parse.urlencode(sorted(request.query_params.lists()), doseq=True)
+        return '{}:{}:{}:{}'.format(self.KEY_PREFIX, version, request.build_absolute_uri('/'), query)
+
+    def stats(self):
+        """Счетчики попаданий и промахов"""
+        counters = cache.get_many([self.HITS_KEY, self.MISSES_KEY])
+        return {
+            'hits': counters.get(self.HITS_KEY, 0),
+            'misses': counters.get(self.MISSES_KEY, 0),
+        }
+
+    def reset_stats(self):
+        cache.delete_many([self.HITS_KEY, self.MISSES_KEY])
+
+    def _count(self, key):
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Счетчик вытеснен из кэша между add и incr
+            pass
+
+
+offer_catalog_cache = OfferCatalogCache()
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+EXPORT_FORMATS = ('csv', 'ndjson')
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+}
+
+# Сколько строк склеивается в одну часть ответа
+EXPORT_CHUNK_ROWS = 1000
+
+
+def format_value(value):
+    # Время отдается в UTC (как оно приходит из БД): перевод в местную зону
+    # через pytz занимает больше половины времени выгрузки
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def csv_chunks(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(['' if value is None else format_value(value) for value in row])
+        if i % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(columns, rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(columns, map(format_value, row))),
+                                cls=DjangoJSONEncoder, ensure_ascii=False))
+        if len(lines) == EXPORT_CHUNK_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def stream_queryset(queryset, export_fields, file_format):
+    """Генератор частей файла выгрузки queryset.
+
+    export_fields - пары (название колонки, поле для values_list). Строки читаются
+    серверным курсором (.iterator()) внутри собственной транзакции: генератор работает
+    уже после выхода из транзакции запроса, а курсор без WITH HOLD не материализует
+    результат на сервере БД. Сортировка сбрасывается, порядок строк не гарантируется.
+    """
+    columns = [column for column, _ in export_fields]
+    chunks = csv_chunks if file_format == 'csv' else ndjson_chunks
+    with transaction.atomic(using=queryset.db):
+        rows = queryset.order_by().values_list(*(field for _, field in export_fields)).iterator()
+        yield from chunks(columns, rows)
+
+
+def streaming_export_response(queryset, export_fields, file_format, file_name):
+    response = StreamingHttpResponse(stream_queryset(queryset, export_fields, file_format),
+                                     content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(file_name, file_format)
+    return response
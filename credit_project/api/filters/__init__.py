@@ -1,3 +1,3 @@
 from .borrower import BorrowerFilterSet
 from .offer import OfferFilterSet
-
+from .search import FullTextSearchFilter
@@ -0,0 +1,115 @@
+import operator
+import re
+from functools import reduce
+
+import phonenumbers
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db.models import F, Q
+from rest_framework.filters import SearchFilter
+
+
+class PrefixSearchQuery(SearchQuery):
+    """to_tsquery вместо plainto_tsquery: значение - готовое выражение вида 'иван:* & петр:*'"""
+
+    def as_sql(self, compiler, connection):
+        config_sql, config_params = compiler.compile(self.config)
+        return 'to_tsquery({}::regconfig, %s)'.format(config_sql), config_params + [self.value]
+
+
+class FullTextSearchFilter(SearchFilter):
+    """SearchFilter, который ищет по ФИО через полнотекстовый индекс.
+
+    Если у вьюсета задан search_vector_field (tsvector-колонка с ФИО анкеты), слова без цифр
+    ищутся по GIN-индексу как префиксы слов ФИО, а результаты сортируются по релевантности.
+    Слова с цифрами (телефон, номер паспорта) ищутся по search_fields,
+    в которых тогда указываются только такие поля.
+    Если слово похоже на номер паспорта или телефона, а у вьюсета заданы
+    search_passport_field / search_phone_field, вместо icontains делается точное
+    сравнение по индексу (телефон предварительно приводится к E.164). Телефон, записанный
+    с пробелами (+7 900 123-45-67), ищется во всей строке поиска до разбиения на слова.
+    Без search_vector_field работает как обычный SearchFilter.
+    """
+    search_config = 'simple'
+    word_re = re.compile(r'\w+')
+    passport_re = re.compile(r'^\d{10}$')
+    phone_re = re.compile(r'^\+?[\d()-]{10,}$')
+    phone_region = 'RU'
+
+    def filter_queryset(self, request, queryset, view):
+        vector_field = getattr(view, 'search_vector_field', None)
+        if vector_field is None:
+            return super().filter_queryset(request, queryset, view)
+
+        phone_numbers, terms = self.extract_phone_numbers(view, request.query_params.get(self.search_param, ''))
+        for phone_number in phone_numbers:
+            queryset = queryset.filter(**{view.search_phone_field: phone_number})
+
+        name_words, number_terms = [], []
+        for term in terms:
+            if any(char.isdigit() for char in term):
+                number_terms.append(term)
+            else:
+                name_words.extend(self.word_re.findall(term))
+
+        if number_terms:
+            queryset = self.filter_number_terms(queryset, view, number_terms)
+        if name_words:
+            query = PrefixSearchQuery(' & '.join('{}:*'.format(word) for word in name_words),
+                                      config=self.search_config)
+            queryset = queryset.filter(**{vector_field: query}).annotate(
+                search_rank=SearchRank(F(vector_field), query)).order_by('-search_rank')
+        return queryset
+
+    def extract_phone_numbers(self, view, query):
+        """Номера телефонов из строки поиска, которые записаны через пробелы (в формате E.164),
+        и слова остальной строки.
+
+        Номер без пробелов остается словом: он может оказаться и номером паспорта
+        (см. get_exact_number_conditions).
+        """
+        if not getattr(view, 'search_phone_field', None):
+            return [], query.replace(',', ' ').split()
+        phone_numbers, parts, end = [], [], 0
+        for match in phonenumbers.PhoneNumberMatcher(query, self.phone_region):
+            if len(match.raw_string.replace(',', ' ').split()) < 2:
+                continue
+            phone_numbers.append(phonenumbers.format_number(match.number, phonenumbers.PhoneNumberFormat.E164))
+            parts.append(query[end:match.start])
+            end = match.end
+        parts.append(query[end:])
+        return phone_numbers, ' '.join(parts).replace(',', ' ').split()
+
+    def filter_number_terms(self, queryset, view, terms):
+        orm_lookups = [self.construct_search(search_field)
+                       for search_field in getattr(view, 'search_fields', ())]
+        for term in terms:
+            conditions = self.get_exact_number_conditions(view, term)
+            if not conditions:
+                conditions = [Q(**{orm_lookup: term}) for orm_lookup in orm_lookups]
+            if not conditions:
+                return queryset.none()
+            queryset = queryset.filter(reduce(operator.or_, conditions))
+        return queryset
+
+    def get_exact_number_conditions(self, view, term):
+        """Условия точного поиска, если term - номер паспорта и/или телефона"""
+        passport_field = getattr(view, 'search_passport_field', None)
+        phone_field = getattr(view, 'search_phone_field', None)
+        conditions = []
+        if passport_field and self.passport_re.match(term):
+            conditions.append(Q(**{passport_field: term}))
+        if phone_field and self.phone_re.match(term):
+            phone_number = self.normalize_phone_number(term)
+            if phone_number:
+                conditions.append(Q(**{phone_field: phone_number}))
+        return conditions
+
+    def normalize_phone_number(self, term):
+        """Номер телефона в формате E.164 или None, если term - не номер телефона"""
+        try:
+            phone_number = phonenumbers.parse(term, self.phone_region)
+        except phonenumbers.NumberParseException:
+            return None
+        if not phonenumbers.is_valid_number(phone_number):
+            return None
+        return phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164)
@@ -0,0 +1,84 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+from urllib import parse
+
+from django.conf import settings
+from django.db import connections
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class CreatedIdCursorPagination(BasePagination):
+    """Keyset-пагинация по (created, id) от новых к старым.
+
+    В отличие от PageNumberPagination не считает COUNT(*) и не делает OFFSET:
+    следующая страница выбирается условием (created, id) < (курсор) по составному индексу.
+    Курсор непрозрачный, первая страница запрашивается с пустым курсором (?cursor=).
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    page_size = settings.CURSOR_PAGINATION_PAGE_SIZE
+    max_page_size = settings.CURSOR_PAGINATION_MAX_PAGE_SIZE
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by('-created', '-id')
+        if position is not None:
+            qn = connections[queryset.db].ops.quote_name
+            table = qn(queryset.model._meta.db_table)
+            queryset = queryset.extra(
+                where=['({table}.{created}, {table}.{id}) < (%s, %s)'.format(
+                    table=table, created=qn('created'), id=qn('id'))],
+                params=position,
+            )
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            return _positive_int(request.query_params[self.page_size_query_param],
+                                 strict=True, cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(last.created, last.id))
+
+    def encode_cursor(self, created, pk):
+        querystring = parse.urlencode({'c': created.isoformat(), 'i': pk})
+        return b64encode(querystring.encode('ascii')).decode('ascii')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            tokens = parse.parse_qs(b64decode(encoded.encode('ascii')).decode('ascii'),
+                                    keep_blank_values=True)
+            created = parse_datetime(tokens['c'][0])
+            pk = int(tokens['i'][0])
+        except (TypeError, ValueError, KeyError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if created is None:
+            raise NotFound(self.invalid_cursor_message)
+        return [created, pk]
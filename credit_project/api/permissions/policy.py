@@ -0,0 +1,76 @@
+from rest_framework import permissions
+
+from credit_project.loans.models import Company
+from credit_project.loans.roles import get_user_role
+from ..utils import is_owner
+
+# Правила доступа
+ALLOW = 'allow'
+# Запрет до загрузки объекта (403 для любого объекта)
+DENY = 'deny'
+# Доступ только к своим объектам
+OWNER = 'owner'
+# Запрет на уровне объекта: чужие объекты не видны (404), для своих - 403
+DENY_OBJECT = 'deny_object'
+
+# Роли пользователей
+SUPERUSER = 'superuser'
+PARTNER = Company.KIND.partner
+CREDIT_ORGANIZATION = Company.KIND.credit_organization
+NO_COMPANY = 'no_company'
+
+# Группы HTTP-методов, '*' - все методы, не перечисленные явно
+METHOD_GROUPS = {
+    'read': ('GET', 'HEAD', 'OPTIONS'),
+    'create': ('POST', ),
+    'update': ('PUT', 'PATCH'),
+    'delete': ('DELETE', ),
+}
+ALL_METHODS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE', 'TRACE')
+
+
+def get_role(user):
+    if not user or not user.is_authenticated:
+        return None
+    role = get_user_role(user)
+    if role.is_superuser:
+        return SUPERUSER
+    return role.company_kind or NO_COMPANY
+
+
+class Policy:
+    """Таблица прав вьюсета: роль -> группа методов -> правило.
+
+    Таблица разворачивается в словарь (роль, метод) -> правило при создании,
+    то есть при импорте модуля вьюсета. Не указанные роли и методы запрещены.
+    """
+
+    def __init__(self, table):
+        self.rules = {}
+        for role, method_rules in table.items():
+            for method in ALL_METHODS:
+                self.rules[(role, method)] = method_rules.get('*', DENY)
+            for group, rule in method_rules.items():
+                if group != '*':
+                    for method in METHOD_GROUPS[group]:
+                        self.rules[(role, method)] = rule
+
+    def get_rule(self, request):
+        return self.rules.get((get_role(request.user), request.method), DENY)
+
+
+class PolicyPermission(permissions.BasePermission):
+    """Проверка прав по таблице view.permission_policy.
+
+    Правило вычисляется один раз на запрос и используется и для проверки объекта.
+    """
+
+    def has_permission(self, request, view):
+        view.permission_rule = view.permission_policy.get_rule(request)
+        return view.permission_rule != DENY
+
+    def has_object_permission(self, request, view, obj):
+        rule = getattr(view, 'permission_rule', None) or view.permission_policy.get_rule(request)
+        if rule == OWNER:
+            return is_owner(obj, request.user)
+        return rule == ALLOW
@@ -1,4 +1,4 @@
-from .borrower import BorrowerSerializer
+from .borrower import BorrowerImportSerializer, BorrowerSerializer
 from .company import CompanySerializer
-from .credit_request import CreditRequestSerializer
+from .credit_request import CreditRequestSerializer, CreditRequestTransitionSerializer
 from .offer import OfferSerializer
@@ -1,10 +1,13 @@
 from phonenumber_field.modelfields import PhoneNumberField
 from rest_framework import serializers
 
-from credit_project.loans.models import Borrower
+from credit_project.loans.importing import FORMATS, guess_format
+from credit_project.loans.models import Borrower, Company
+from ..utils import get_user_company_id
+from .mixins import SparseFieldsMixin
 
 
-class BorrowerSerializer(serializers.ModelSerializer):
+class BorrowerSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='api:borrower-detail')
     phone_number = serializers.CharField(validators=PhoneNumberField().validators)
     company_url = serializers.HyperlinkedIdentityField(view_name='api:company-detail',
@@ -29,12 +32,40 @@ class BorrowerSerializer(serializers.ModelSerializer):
         super().__init__(*args, **kwargs)
         self.user = self.context['request'].user
 
-        if not self.user.is_superuser:
+        if not self.user.is_superuser and 'company' in self.fields:
             self.fields['company'].read_only = True
 
-
     def validate(self, attrs):
         if not self.user.is_superuser:
-            attrs['company'] = self.user.company
+            attrs['company_id'] = get_user_company_id(self.user)
+        return attrs
+
+
+class BorrowerImportSerializer(serializers.Serializer):
+    """Параметры импорта анкет. Партнеры загружают анкеты своей компании,
+    суперпользователи указывают компанию явно.
+    """
+    file = serializers.FileField()
+    file_format = serializers.ChoiceField(choices=FORMATS, required=False)
+    company = serializers.PrimaryKeyRelatedField(queryset=Company.objects.filter(kind=Company.KIND.partner),
+                                                 required=False)
+    match = serializers.BooleanField(default=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.user = self.context['request'].user
+
+    def validate(self, attrs):
+        if not attrs.get('file_format'):
+            attrs['file_format'] = guess_format(attrs['file'].name)
+            if attrs['file_format'] is None:
+                raise serializers.ValidationError({'file_format': ['Не удалось определить формат файла']})
+        if self.user.is_superuser:
+            if 'company' not in attrs:
+                raise serializers.ValidationError({'company': ['Обязательное поле']})
+            attrs['company_id'] = attrs.pop('company').id
+        else:
+            attrs.pop('company', None)
+            attrs['company_id'] = get_user_company_id(self.user)
         return attrs
 
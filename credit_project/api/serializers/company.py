@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
 from credit_project.loans.models import Company
+from .mixins import SparseFieldsMixin
 
 
-class CompanySerializer(serializers.ModelSerializer):
+class CompanySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='api:company-detail')
 
     class Meta:
@@ -1,10 +1,13 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from credit_project.api.serializers.borrower import BorrowerSerializer
 from credit_project.loans.models import CreditRequest
+from ..utils import get_user_company_id
+from .mixins import SparseFieldsMixin
 
 
-class CreditRequestSerializer(serializers.ModelSerializer):
+class CreditRequestSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='api:credit_request-detail')
     borrower_detail = serializers.SerializerMethodField()
     offer_url = serializers.HyperlinkedIdentityField(view_name='api:offer-detail',
@@ -23,9 +26,14 @@ class CreditRequestSerializer(serializers.ModelSerializer):
                   'offer',
                   'offer_url', )
 
+    expandable_fields = {'borrower': 'borrower_detail'}
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.user = self.context['request'].user
+        if self.requested_fields is not None:
+            # Набор полей ограничивается только при чтении, настройка полей для записи не нужна
+            return
 
         self.fields['sent_date'].read_only = True
 
@@ -45,13 +53,34 @@ class CreditRequestSerializer(serializers.ModelSerializer):
 
         if not self.user.is_superuser:
             # При создании заявки можно указать только свои анкеты
-            if hasattr(self.user, 'company'):
+            company_id = get_user_company_id(self.user)
+            if company_id is not None:
                 self.fields['borrower'].queryset = self.fields['borrower'].queryset.filter(
-                    company=self.user.company)
+                    company_id=company_id)
             else:
                 self.fields['borrower'].queryset = self.fields['borrower'].queryset.none()
 
         self.fields['offer'].queryset = self.fields['offer'].queryset.active()
 
+    def get_validators(self):
+        if not self.instance:
+            # При создании предложение не обязательно (заявки создаются по всем подходящим),
+            # а уже существующие пары анкета/предложение задача пропускает,
+            # поэтому проверка unique_together нужна только при редактировании
+            return []
+        return super().get_validators()
+
     def get_borrower_detail(self, obj):
-        return BorrowerSerializer(obj.borrower, context=self.context).data
+        # В списке один экземпляр сериализатора используется для всех строк,
+        # поэтому вложенный сериализатор анкеты создаем один раз
+        if not hasattr(self, '_borrower_serializer'):
+            self._borrower_serializer = BorrowerSerializer(context=self.context)
+        return self._borrower_serializer.to_representation(obj.borrower)
+
+
+class CreditRequestTransitionSerializer(serializers.Serializer):
+    """Массовый перевод заявок в статус status"""
+    ids = serializers.ListField(child=serializers.IntegerField(), min_length=1,
+                                max_length=settings.CREDIT_REQUESTS_TRANSITION_MAX_IDS)
+    status = serializers.ChoiceField(
+        choices=[(status, CreditRequest.STATUSES[status]) for status in CreditRequest.STATUS_TRANSITIONS])
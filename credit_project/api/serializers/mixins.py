@@ -0,0 +1,19 @@
+class SparseFieldsMixin:
+    """Ограничение набора полей сериализатора: Serializer(..., fields={'id', 'status'}).
+
+    Не запрошенные поля отбрасываются в get_field_names, то есть еще до построения полей,
+    поэтому для них не создаются ни поля, ни ссылки, ни вложенные сериализаторы.
+    fields=None - все поля. В expandable_fields перечисляются вложенные объекты,
+    которые можно добавить к набору параметром expand: название -> поле сериализатора.
+    """
+    expandable_fields = {}
+
+    def __init__(self, *args, **kwargs):
+        self.requested_fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+    def get_field_names(self, declared_fields, info):
+        field_names = super().get_field_names(declared_fields, info)
+        if self.requested_fields is None:
+            return field_names
+        return [field_name for field_name in field_names if field_name in self.requested_fields]
@@ -1,9 +1,10 @@
 from rest_framework import serializers
 
 from credit_project.loans.models import Offer
+from .mixins import SparseFieldsMixin
 
 
-class OfferSerializer(serializers.ModelSerializer):
+class OfferSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.HyperlinkedIdentityField(view_name='api:offer-detail')
     company_url = serializers.HyperlinkedIdentityField(view_name='api:company-detail',
                                                        lookup_field='company_id',
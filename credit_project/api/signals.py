@@ -0,0 +1,25 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from credit_project.loans.roles import user_role_invalidated
+from .authentication import invalidate_token, invalidate_user_tokens
+
+
+@receiver(post_delete, sender=Token)
+def revoke_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_changed_user_tokens(sender, instance, update_fields, **kwargs):
+    # Вход в систему меняет только last_login, который в кэше токена не хранится
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_user_tokens(instance.pk)
+
+
+@receiver(user_role_invalidated)
+def invalidate_user_role_tokens(sender, user_id, **kwargs):
+    invalidate_user_tokens(user_id)
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from rest_framework.test import APITestCase, APIClient
 
 from credit_project.loans.models import Company
@@ -23,6 +24,8 @@ class CreditAPITestCaseWithUsers(APITestCase):
                                         user=cls.co_user)
 
     def setUp(self):
+        # В кэше живут данные, вычисленные по БД (индекс и каталог предложений)
+        cache.clear()
         self.client_partner = APIClient()
         self.client_partner.login(username=self.partner_user.username, password='defaultpassword')
         self.client_co = APIClient()
@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APIRequestFactory, APITransactionTestCase
+
+from credit_project.api.authentication import CachedTokenAuthentication
+from credit_project.loans.models import Company
+from credit_project.loans.roles import get_user_role
+from .factories import CompanyFactory, UserFactory
+
+
+class TokenAuthenticationTestCase(APITransactionTestCase):
+    """Сброс кэша токенов происходит в on_commit, поэтому тесты выполняются вне транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.company = CompanyFactory(kind=Company.KIND.partner, user=self.user)
+        self.objects_list_url = reverse('api:company-list')
+
+        response = APIClient().post(reverse('api:token'), {'username': self.user.username,
+                                                           'password': 'defaultpassword'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.token = Token.objects.get(key=response.data['token'])
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION='Token ' + self.token.key)
+
+    def test_cached(self):
+        """Пользователь и роль по токену берутся из кэша без запросов к БД"""
+        response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.objects_list_url)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.company.id])
+        self.assertEqual(len(queries), 2)
+        self.assertFalse([query for query in queries
+                          if 'authtoken_token' in query['sql'] or 'auth_user' in query['sql']])
+
+        # request.auth - токен, как у TokenAuthentication
+        request = APIRequestFactory().get(self.objects_list_url, HTTP_AUTHORIZATION='Token ' + self.token.key)
+        with self.assertNumQueries(0):
+            user, token = CachedTokenAuthentication().authenticate(request)
+        self.assertIsInstance(token, Token)
+        self.assertEqual((token.pk, token.user_id, token.created), (self.token.pk, self.user.id, self.token.created))
+        self.assertIs(token.user, user)
+
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke(self):
+        self.client.get(self.objects_list_url)
+        self.token.delete()
+        response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_revoke_during_read(self):
+        """Отзыв, закоммиченный между чтением токена из БД и записью в кэш, не оставляет доступ"""
+        def revoke(user):
+            self.token.delete()
+            return get_user_role(user)
+
+        with mock.patch('credit_project.api.authentication.get_user_role', side_effect=revoke):
+            response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_change(self):
+        self.client.get(self.objects_list_url)
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_company_change(self):
+        """Пользователь, у которого больше нет компании, теряет доступ"""
+        self.client.get(self.objects_list_url)
+        self.company.user = UserFactory()
+        self.company.save()
+        response = self.client.get(self.objects_list_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -1,12 +1,16 @@
+from unittest import mock
 import datetime
 
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
 from rest_framework.reverse import reverse
 from rest_framework import status
 
 from credit_project.loans.models import Company, Borrower
-from .factories import BorrowerFactory, CompanyFactory
+from credit_project.loans.tasks import CreateOfferRequestsTask
+from .factories import BorrowerFactory, CompanyFactory, OfferFactory
 from .mixins import CreditAPITestCaseWithUsers
-from .utils import build_absolute_url
+from .utils import build_absolute_url, get_tz_datetime
 
 
 class BorrowerViewTestCase(CreditAPITestCaseWithUsers):
@@ -76,6 +80,68 @@ class BorrowerViewTestCase(CreditAPITestCaseWithUsers):
         response = self.client_co.get(self.objects_list_url)
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_cursor_pagination(self):
+        """Keyset-пагинация для машинных клиентов"""
+        response = self.client_superuser.get(self.objects_list_url + '?cursor=&page_size=1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.partner2_borrower.id])
+
+        response = self.client_superuser.get(response.data['next'])
+        self.assertEqual([item['id'] for item in response.data['results']], [self.partner_borrower.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_conditional_get(self):
+        """Повторный запрос с ETag / If-Modified-Since получает 304, пока данные не изменились"""
+        for url in (self.objects_list_url, self.partner_borrower_url):
+            response = self.client_partner.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+
+            response = self.client_partner.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(response['ETag'], etag)
+            response = self.client_partner.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            self.partner_borrower.save()
+            response = self.client_partner.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotEqual(response['ETag'], etag)
+
+        # Другие параметры запроса - другой ETag
+        etag = self.client_partner.get(self.objects_list_url)['ETag']
+        response = self.client_partner.get(self.objects_list_url, {'search': 'Last'},
+                                           HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_search(self):
+        """Поиск по префиксам слов ФИО и по номерам телефона и паспорта"""
+        def search(query):
+            response = self.client_superuser.get(self.objects_list_url, {'search': query})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [item['id'] for item in response.data['results']]
+
+        both = [self.partner_borrower.id, self.partner2_borrower.id]
+        self.assertCountEqual(search('Las Fir'), both)
+        self.assertEqual(search('midd 2233'), [self.partner_borrower.id])
+        self.assertEqual(search('Nam 999111'), [self.partner_borrower.id])
+        self.assertEqual(search('8888888888'), [self.partner2_borrower.id])
+        self.assertEqual(search('Ivanov'), [])
+
+        # Номера паспорта и телефона в любом формате ищутся точным совпадением
+        self.assertEqual(search('9991112233'), [self.partner_borrower.id])
+        self.assertEqual(search('89991112233'), [self.partner_borrower.id])
+        self.assertEqual(search('+7(999)999-99-99'), [self.partner2_borrower.id])
+        # Телефон с пробелами и разделителями не разбивается на слова
+        self.assertEqual(search('+7 999 999-99-99'), [self.partner2_borrower.id])
+        self.assertEqual(search('8 (999) 111 22 33 Last'), [self.partner_borrower.id])
+        self.assertEqual(search('Last 8888888888'), [self.partner2_borrower.id])
+
+        # Анкета, у которой совпало больше слов, выше в выдаче
+        self.partner2_borrower.middle_name = 'Name Name'
+        self.partner2_borrower.save()
+        self.assertEqual(search('name')[0], self.partner2_borrower.id)
+
     def test_list_fields(self):
         """Проверяем, что api возвращает все поля, необходимые для отображения списка"""
 
@@ -84,6 +150,15 @@ class BorrowerViewTestCase(CreditAPITestCaseWithUsers):
 
         self.assertDictEqual(object_as_dict, self.partner_borrower_as_dict)
     #
+    def test_detail_query_count(self):
+        """Проверка прав на анкету не делает дополнительных запросов"""
+        self.client_partner.get(self.partner_borrower_url)
+        # Сессия, пользователь, сам объект и savepoint транзакции запроса: компания пользователя
+        # берется из кэша, а проверка владельца сравнивает id компаний и не делает запросов
+        with self.assertNumQueries(5):
+            response = self.client_partner.get(self.partner_borrower_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_detail_permissions(self):
         """Проверка прав на просмотр детальной информации
         """
@@ -139,6 +214,52 @@ class BorrowerViewTestCase(CreditAPITestCaseWithUsers):
         response = self.client_co.post(self.objects_list_url, {})
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+    def test_import(self):
+        """Импорт анкет файлом: корректные строки сохраняются, по остальным - отчет об ошибках"""
+        import_url = reverse('api:borrower-import-borrowers')
+        content = (
+            'last_name,first_name,middle_name,birth_date,phone_number,passport_number,score\n'
+            'Ivanov,Ivan,Ivanovich,1980-01-02,8 999 123-45-67,1234567890,500\n'
+            'Петров,Петр,Петрович,1980-01-02,+79991234567,123,500\n'
+            'Сидоров,,Сидорович,02.01.1980,123,1234567890,-1\n'
+        ).encode('utf-8')
+
+        response = self.client_partner.post(
+            import_url, {'file': SimpleUploadedFile('borrowers.csv', content)}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+        self.assertEqual(set(response.data['errors'][0]['errors']), {'passport_number'})
+        self.assertEqual(set(response.data['errors'][1]['errors']),
+                         {'first_name', 'birth_date', 'phone_number', 'score'})
+
+        borrower = Borrower.objects.get(last_name='Ivanov')
+        self.assertEqual(borrower.company, self.partner_company)
+        self.assertEqual(str(borrower.phone_number), '+79991234567')
+        self.assertEqual(borrower.birth_date, datetime.date(1980, 1, 2))
+        # Строки из COPY доступны поиску
+        response = self.client_partner.get(self.objects_list_url, {'search': 'ivan'})
+        self.assertEqual([item['id'] for item in response.data['results']], [borrower.id])
+
+        # Суперпользователь указывает компанию, JSONL
+        content = '{"last_name": "A", "first_name": "B", "middle_name": "C", "birth_date": "1990-01-01", ' \
+                  '"phone_number": "+79990000000", "passport_number": "0000000000", "score": 1}\nnot json\n'
+        response = self.client_superuser.post(
+            import_url, {'file': SimpleUploadedFile('borrowers.jsonl', content.encode('utf-8')),
+                         'company': self.partner2_company.id}, format='multipart')
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2])
+        self.assertTrue(Borrower.objects.filter(company=self.partner2_company, last_name='A').exists())
+
+        response = self.client_superuser.post(
+            import_url, {'file': SimpleUploadedFile('borrowers.txt', content.encode('utf-8'))}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # КО не могут загружать анкеты
+        response = self.client_co.post(
+            import_url, {'file': SimpleUploadedFile('borrowers.csv', b'')}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
     def test_delete(self):
         """Удаление
         """
@@ -211,3 +332,26 @@ class BorrowerViewTestCase(CreditAPITestCaseWithUsers):
         # Суперпользователям разрешено
         response = self.client_superuser.patch(borrower_url, self.partner_borrower_as_dict)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @mock.patch('credit_project.api.views.borrower.enqueue')
+    def test_score_update_creates_requests_for_newly_eligible_offers(self, enqueue_mock):
+        """При изменении балла заявки создаются только по предложениям, ставшим доступными"""
+        cache.clear()
+        borrower = BorrowerFactory(score=300, company=self.partner_company)
+        borrower_url = reverse('api:borrower-detail', kwargs={'pk': borrower.id})
+        rotation = {'rotation_start': get_tz_datetime(1990, 1, 1),
+                    'rotation_end': get_tz_datetime(2100, 1, 1)}
+        OfferFactory(min_score=100, max_score=1000, **rotation)
+        new_offer = OfferFactory(min_score=400, max_score=600, **rotation)
+        OfferFactory(min_score=700, max_score=1000, **rotation)
+
+        response = self.client_superuser.patch(borrower_url, {'score': 500})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        enqueue_mock.assert_called_once_with(mock.ANY, kwargs={'borrower_id': borrower.id, 'offer_ids': [new_offer.id]})
+        self.assertIsInstance(enqueue_mock.call_args[0][0], CreateOfferRequestsTask)
+
+        # Балл не изменился
+        enqueue_mock.reset_mock()
+        response = self.client_superuser.patch(borrower_url, {'score': 500})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        enqueue_mock.assert_not_called()
@@ -49,6 +49,15 @@ class CompanyViewTestCase(CreditAPITestCaseWithUsers):
 
         self.assertDictEqual(object_as_dict, valid_list_item_dict)
 
+    def test_detail_query_count(self):
+        """Проверка прав на компанию не делает дополнительных запросов"""
+        self.client_partner.get(self.partner_company_url)
+        # Сессия, пользователь, сам объект и savepoint транзакции запроса: компания пользователя
+        # берется из кэша, а проверка владельца сравнивает id компаний и не делает запросов
+        with self.assertNumQueries(5):
+            response = self.client_partner.get(self.partner_company_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_detail_permissions(self):
         """Проверка прав на просмотр детальной информации
         """
@@ -1,13 +1,24 @@
 from unittest import mock
+import csv
 import datetime
+import io
+import json
 
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
 from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.reverse import reverse
 from rest_framework import status
+from rest_framework.test import APIClient, APITransactionTestCase
 
 from credit_project.api.tests.factories import CompanyFactory, BorrowerFactory, OfferFactory, \
-    CreditRequestFactory
+    CreditRequestFactory, UserFactory
+from credit_project.loans.jobs import get_idempotency_cache_key
 from credit_project.loans.models import Company, CreditRequest
+from credit_project.loans.tasks import CreateOfferRequestsTask
 from .mixins import CreditAPITestCaseWithUsers
 from .utils import build_absolute_url, get_tz_datetime
 
@@ -108,6 +119,196 @@ class CreditRequestViewTestCase(CreditAPITestCaseWithUsers):
 
         self.assertDictEqual(object_as_dict, valid_list_item_dict)
 
+    @mock.patch.object(PageNumberPagination, 'page_size', 100)
+    def test_list_query_count(self):
+        """Количество запросов на страницу списка не зависит от количества заявок на ней"""
+        borrowers = [BorrowerFactory(company=self.partner_company) for _ in range(10)]
+        offers = [OfferFactory(company=self.co_company) for _ in range(10)]
+        CreditRequestFactory(borrower=borrowers[0], offer=offers[0])
+
+        clients = (self.client_superuser, self.client_partner, self.client_co)
+        # Роль пользователя кэшируется при первом запросе
+        for client in clients:
+            client.get(self.objects_list_url)
+        query_counts = []
+        for client in clients:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(self.objects_list_url)
+            self.assertEqual(len(response.data['results']), 1)
+            query_counts.append(len(queries))
+
+        for borrower in borrowers:
+            for offer in offers:
+                if (borrower, offer) != (borrowers[0], offers[0]):
+                    CreditRequestFactory(borrower=borrower, offer=offer)
+
+        for client, query_count in zip(clients, query_counts):
+            with self.assertNumQueries(query_count):
+                response = client.get(self.objects_list_url)
+            self.assertEqual(len(response.data['results']), 100)
+
+    def test_sparse_fields(self):
+        """?fields= отдает только запрошенные поля, анкета без expand не загружается"""
+        self.create_default_credit_requests()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_co.get(self.objects_list_url, {'fields': 'id,status,offer,unknown'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual({tuple(item) for item in response.data['results']}, {('id', 'status', 'offer')})
+        self.assertFalse([query for query in queries if 'loans_borrower' in query['sql']])
+
+        response = self.client_co.get(self.objects_list_url, {'fields': 'id', 'expand': 'borrower'})
+        item = next(item for item in response.data['results'] if item['id'] == self.credit_request_1_1.id)
+        self.assertEqual(list(item), ['id', 'borrower_detail'])
+        self.assertEqual(item['borrower_detail']['id'], self.borrower.id)
+
+        response = self.client_co.get(self.credit_request_1_1_url, {'fields': 'status,offer_url'})
+        self.assertEqual(set(response.data), {'status', 'offer_url'})
+        etag = response['ETag']
+        # Ответ без анкеты не зависит от ее изменения
+        self.borrower.save()
+        response = self.client_co.get(self.credit_request_1_1_url, {'fields': 'status,offer_url'},
+                                      HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # При изменении набор полей не ограничивается
+        response = self.client_co.patch(self.credit_request_1_1_url + '?fields=id',
+                                         {'status': CreditRequest.STATUSES.approved})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('borrower_detail', response.data)
+
+    def test_cursor_pagination(self):
+        """Keyset-пагинация для машинных клиентов"""
+        self.create_default_credit_requests()
+        CreditRequest.objects.update(created=get_tz_datetime(2018, 1, 1))
+        expected_ids = sorted(CreditRequest.objects.values_list('id', flat=True), reverse=True)
+
+        ids = []
+        url = self.objects_list_url + '?cursor=&page_size=3'
+        while url:
+            response = self.client_superuser.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids += [item['id'] for item in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, expected_ids)
+
+        # Видимость по ролям сохраняется
+        response = self.client_partner.get(self.objects_list_url + '?cursor=')
+        self.assertEqual({item['id'] for item in response.data['results']},
+                         {self.credit_request_1_1.id, self.credit_request_1_2.id})
+
+        response = self.client_superuser.get(self.objects_list_url + '?cursor=invalid')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        # ETag страницы считается по ее строкам, без COUNT по всей выборке
+        url = self.objects_list_url + '?cursor=&page_size=3'
+        etag = self.client_superuser.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_superuser.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        CreditRequest.objects.filter(id=expected_ids[0]).update(modified=get_tz_datetime(2030, 1, 1))
+        response = self.client_superuser.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_conditional_get(self):
+        """ETag заявки меняется при изменении заявки и встроенной в нее анкеты"""
+        self.create_default_credit_requests()
+
+        for url in (self.objects_list_url, self.credit_request_1_1_url):
+            etag = self.client_co.get(url)['ETag']
+            response = self.client_co.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+            self.credit_request_1_1.borrower.save()
+            response = self.client_co.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            etag = response['ETag']
+
+            self.credit_request_1_1.save()
+            response = self.client_co.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_export(self):
+        """Потоковая выгрузка заявок в CSV и NDJSON с учетом ролей и фильтров"""
+        self.create_default_credit_requests()
+        export_url = reverse('api:credit_request-export')
+
+        def export(client, **params):
+            response = client.get(export_url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response.streaming)
+            return b''.join(response.streaming_content).decode('utf-8')
+
+        rows = list(csv.DictReader(io.StringIO(export(self.client_co))))
+        self.assertEqual({int(row['id']) for row in rows},
+                         {self.credit_request_1_1.id, self.credit_request_2_1.id})
+        row = next(row for row in rows if int(row['id']) == self.credit_request_1_1.id)
+        self.assertEqual(row['passport_number'], self.borrower.passport_number)
+        self.assertEqual(int(row['offer']), self.offer.id)
+        self.assertEqual(row['sent_date'], '')
+
+        lines = export(self.client_partner, file_format='ndjson').splitlines()
+        items = [json.loads(line) for line in lines]
+        self.assertEqual({item['id'] for item in items},
+                         {self.credit_request_1_1.id, self.credit_request_1_2.id})
+        self.assertEqual(items[0]['birth_date'], self.borrower.birth_date.isoformat())
+
+        CreditRequest.objects.update(status=CreditRequest.STATUSES.new)
+        CreditRequest.objects.filter(id=self.credit_request_1_2.id).update(status=CreditRequest.STATUSES.sent)
+        lines = export(self.client_superuser, file_format='ndjson', status=CreditRequest.STATUSES.sent).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], [self.credit_request_1_2.id])
+
+        response = self.client_superuser.get(export_url, {'file_format': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client_anyuser.get(export_url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_transition(self):
+        """Массовый перевод заявок в статус: только допустимые переходы и только по своим предложениям"""
+        self.create_default_credit_requests()
+        transition_url = reverse('api:credit_request-transition')
+        CreditRequest.objects.update(status=CreditRequest.STATUSES.new)
+        CreditRequest.objects.filter(id=self.credit_request_2_1.id).update(status=CreditRequest.STATUSES.received)
+
+        # Заявка 1_2 - по чужому предложению, 2_1 - в статусе, из которого нельзя отправить
+        ids = [self.credit_request_1_1.id, self.credit_request_1_2.id, self.credit_request_2_1.id]
+        response = self.client_co.patch(transition_url, {'ids': ids, 'status': 'sent'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['updated'], [self.credit_request_1_1.id])
+        self.assertEqual(response.data['skipped'], sorted([self.credit_request_1_2.id, self.credit_request_2_1.id]))
+        self.credit_request_1_1.refresh_from_db()
+        self.assertEqual(self.credit_request_1_1.status, CreditRequest.STATUSES.sent)
+        self.assertIsNotNone(self.credit_request_1_1.sent_date)
+        self.assertEqual(CreditRequest.objects.get(id=self.credit_request_1_2.id).status, CreditRequest.STATUSES.new)
+
+        response = self.client_co.patch(transition_url, {'ids': ids, 'status': 'approved'}, format='json')
+        self.assertEqual(response.data['updated'], [self.credit_request_2_1.id])
+
+        response = self.client_superuser.patch(
+            transition_url, {'ids': [self.credit_request_1_2.id], 'status': 'sent'}, format='json')
+        self.assertEqual(response.data['updated'], [self.credit_request_1_2.id])
+
+        for data in ({'ids': ids, 'status': 'new'}, {'ids': [], 'status': 'sent'}, {'status': 'sent'}):
+            response = self.client_co.patch(transition_url, data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        for client in (self.client_partner, self.client_anyuser):
+            response = client.patch(transition_url, {'ids': ids, 'status': 'sent'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_detail_query_count(self):
+        """Проверка прав на заявку не делает дополнительных запросов"""
+        self.create_default_credit_requests()
+        for client in (self.client_partner, self.client_co):
+            client.get(self.credit_request_1_1_url)
+            # Сессия, пользователь, сам объект и savepoint транзакции запроса: компания пользователя
+            # берется из кэша, а проверка владельца сравнивает id компаний и не делает запросов
+            with self.assertNumQueries(5):
+                response = client.get(self.credit_request_1_1_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
     def test_detail_permissions(self):
         """Проверка прав на просмотр детальной информации
         """
@@ -233,6 +434,10 @@ class CreditRequestViewTestCase(CreditAPITestCaseWithUsers):
         response = self.client_superuser.patch(self.credit_request_1_1_url, credit_request_as_dict)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
+        # Пара анкета/предложение уже занята другой заявкой
+        response = self.client_superuser.patch(self.credit_request_1_1_url, {'borrower': self.borrower2.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_co_can_update_only_status(self):
         """Проверяем, что кредитные организации могут обновлять только статус"""
 
@@ -309,3 +514,134 @@ class CreditRequestViewTestCase(CreditAPITestCaseWithUsers):
                                               kwargs={'pk': self.credit_request_2_1.id})
         self.credit_request_2_2_url = reverse('api:credit_request-detail',
                                               kwargs={'pk': self.credit_request_2_2.id})
+
+
+class CreditRequestJobTestCase(APITransactionTestCase):
+    """Вьюха статуса задания работает без транзакции запроса, поэтому тесты выполняются вне транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.objects_list_url = reverse('api:credit_request-list')
+        self.partner_company = CompanyFactory(kind=Company.KIND.partner, user=UserFactory())
+        self.client_partner = APIClient()
+        self.client_partner.force_authenticate(self.partner_company.user)
+        self.client_co = APIClient()
+        self.client_co.force_authenticate(CompanyFactory(kind=Company.KIND.credit_organization,
+                                                         user=UserFactory()).user)
+
+    @override_settings(CREDIT_REQUEST_JOB_POLL_INTERVAL=0.01)
+    @mock.patch('credit_project.loans.tasks.RematchOfferTask.apply_async')
+    @mock.patch('credit_project.loans.tasks.CreateOfferRequestsTask.apply_async')
+    def test_create_job(self, apply_async_mock, rematch_mock):
+        """POST возвращает задание, статус которого читается из кэша"""
+        borrower = BorrowerFactory(company=self.partner_company, score=300)
+        offer = OfferFactory(min_score=100, max_score=500,
+                             rotation_start=get_tz_datetime(1990, 1, 1),
+                             rotation_end=get_tz_datetime(2100, 1, 1))
+
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job_url = response.data['job_url']
+        self.assertEqual(apply_async_mock.call_args[0][1]['job_id'], response.data['job'])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_partner.get(job_url, {'wait': '0.05'})
+        self.assertEqual(response.data, {'state': 'pending'})
+        self.assertEqual(len(queries), 0)
+
+        CreateOfferRequestsTask().run(**apply_async_mock.call_args[0][1])
+        response = self.client_partner.get(job_url, {'wait': 10})
+        self.assertEqual(response.data, {
+            'state': 'success',
+            'created': 1,
+            'ids': list(CreditRequest.objects.filter(borrower=borrower, offer=offer).values_list('id', flat=True)),
+        })
+
+        # Задание видно только создавшему его пользователю
+        response = self.client_co.get(job_url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client_partner.get(job_url, {'wait': 'soon'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @mock.patch('credit_project.loans.tasks.RematchOfferTask.apply_async')
+    @mock.patch('credit_project.loans.tasks.CreateOfferRequestsTask.apply_async')
+    def test_create_idempotency(self, apply_async_mock, rematch_mock):
+        """Повторы с тем же Idempotency-Key и по той же анкете возвращают уже поставленное задание"""
+        borrower = BorrowerFactory(company=self.partner_company)
+        borrower2 = BorrowerFactory(company=self.partner_company)
+        offer = OfferFactory(rotation_start=get_tz_datetime(1990, 1, 1), rotation_end=get_tz_datetime(2100, 1, 1))
+
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job_id = response.data['job']
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.data['job'], job_id)
+        # Без ключа запрос склеивается с заданием по той же анкете
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id})
+        self.assertEqual(response.data['job'], job_id)
+        self.assertEqual(apply_async_mock.call_count, 1)
+
+        # Новый ключ для той же анкеты тоже попадает в уже поставленное задание
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-2')
+        self.assertEqual(response.data['job'], job_id)
+
+        # Другие предложение или анкета - новые задания
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id, 'offer': offer.id})
+        self.assertNotEqual(response.data['job'], job_id)
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower2.id})
+        self.assertNotEqual(response.data['job'], job_id)
+        self.assertEqual(apply_async_mock.call_count, 3)
+
+        # Ключ, использованный для другого запроса
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower2.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('idempotency_key', response.data)
+
+        with override_settings(CREDIT_REQUEST_COALESCE_WINDOW=0):
+            response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id})
+            self.assertNotEqual(response.data['job'], job_id)
+            response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                                HTTP_IDEMPOTENCY_KEY='retry-1')
+            self.assertEqual(response.data['job'], job_id)
+        self.assertEqual(apply_async_mock.call_count, 4)
+
+    @mock.patch('credit_project.loans.tasks.RematchOfferTask.apply_async')
+    @mock.patch('credit_project.loans.tasks.CreateOfferRequestsTask.apply_async', side_effect=ConnectionError)
+    def test_create_publish_error(self, apply_async_mock, rematch_mock):
+        """Если задачу не удалось отправить, задание неуспешно, а повтор с тем же ключом создает новое"""
+        borrower = BorrowerFactory(company=self.partner_company)
+
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        job_id = response.data['job']
+        self.assertEqual(self.client_partner.get(response.data['job_url']).data['state'], 'failure')
+
+        apply_async_mock.side_effect = None
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertNotEqual(response.data['job'], job_id)
+        self.assertEqual(apply_async_mock.call_count, 2)
+
+    @mock.patch('credit_project.loans.tasks.RematchOfferTask.apply_async')
+    @mock.patch('credit_project.loans.tasks.CreateOfferRequestsTask.apply_async')
+    def test_create_rollback(self, apply_async_mock, rematch_mock):
+        """Если транзакция запроса откачена, задание неуспешно, а повтор с тем же ключом создает новое"""
+        borrower = BorrowerFactory(company=self.partner_company)
+        idempotency_cache_key = get_idempotency_cache_key(self.partner_company.user_id, 'retry-1')
+
+        with mock.patch('credit_project.api.views.credit_request.enqueue', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                         HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertIsNone(cache.get(idempotency_cache_key))
+
+        response = self.client_partner.post(self.objects_list_url, {'borrower': borrower.id},
+                                            HTTP_IDEMPOTENCY_KEY='retry-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(cache.get(idempotency_cache_key), response.data['job'])
+        apply_async_mock.assert_called_once_with(None, mock.ANY, producer=mock.ANY)
@@ -1,12 +1,16 @@
 import datetime
 from unittest import mock
 
+from django.db import connection
 from django.forms.models import model_to_dict
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework.reverse import reverse
 from rest_framework import status
 
 from credit_project.loans.models import Company, Borrower, Offer
+from credit_project.loans.offer_index import offer_index
+from ..cache import offer_catalog_cache
 from .factories import BorrowerFactory, CompanyFactory, OfferFactory
 from .mixins import CreditAPITestCaseWithUsers
 from .utils import build_absolute_url, get_tz_datetime
@@ -55,6 +59,47 @@ class OfferViewTestCase(CreditAPITestCaseWithUsers):
 
         self.assertDictEqual(object_as_dict, self.co_offer_as_dict)
 
+    @mock.patch('django.utils.timezone.now')
+    def test_list_cache(self, now_mock):
+        """Каталог активных предложений для партнеров отдается из кэша"""
+        now_mock.return_value = get_tz_datetime(2010, 6, 1)
+        self.create_offers()
+
+        response = self.client_partner.get(self.objects_list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            cached_response = self.client_partner.get(self.objects_list_url)
+        self.assertEqual(cached_response['X-Cache'], 'HIT')
+        self.assertFalse([query for query in queries if 'loans_offer' in query['sql']])
+        self.assertEqual(cached_response.data, response.data)
+
+        # Каждый набор фильтров кэшируется отдельно
+        response = self.client_partner.get(self.objects_list_url, {'company': self.co_company.id})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 1)
+        response = self.client_partner.get(self.objects_list_url, {'fields': 'id,name'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual({tuple(item) for item in response.data['results']}, {('id', 'name')})
+
+        # Изменение предложения сбрасывает кэш (в TestCase on_commit не вызывается)
+        offer_index._invalidate()
+        response = self.client_partner.get(self.objects_list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+
+        # После конца ротации каталог перестраивается
+        self.client_partner.get(self.objects_list_url)
+        now_mock.return_value = get_tz_datetime(2011, 1, 2)
+        response = self.client_partner.get(self.objects_list_url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+        self.assertEqual(offer_catalog_cache.stats(), {'hits': 2, 'misses': 5})
+
+        # Клиент с актуальным ETag получает 304 без обращения к кэшу
+        response = self.client_partner.get(self.objects_list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(offer_catalog_cache.stats(), {'hits': 2, 'misses': 5})
+
     def test_detail_permissions(self):
         """Проверка прав на просмотр детальной информации
         """
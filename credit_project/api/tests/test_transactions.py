@@ -0,0 +1,44 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient, APITransactionTestCase
+
+from credit_project.loans.models import Borrower, Company
+from .factories import BorrowerFactory, CompanyFactory, UserFactory
+
+
+class NonAtomicReadTestCase(APITransactionTestCase):
+    """Транзакции запросов видны только вне тестовой транзакции"""
+
+    def setUp(self):
+        cache.clear()
+        self.company = CompanyFactory(kind=Company.KIND.partner, user=UserFactory(is_superuser=True))
+        self.borrower = BorrowerFactory(company=self.company, score=300)
+        self.client = APIClient()
+        self.client.force_authenticate(self.company.user)
+
+    def test_read_without_transaction(self):
+        with mock.patch.object(connection, 'commit', wraps=connection.commit) as commit_mock:
+            for url_name in ('api:borrower-list', 'api:company-list', 'api:credit_request-list', 'api:offer-list'):
+                response = self.client.get(reverse(url_name))
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+            response = self.client.get(reverse('api:borrower-detail', kwargs={'pk': self.borrower.id}))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        commit_mock.assert_not_called()
+
+    def test_write_in_transaction(self):
+        borrower_url = reverse('api:borrower-detail', kwargs={'pk': self.borrower.id})
+        with mock.patch.object(connection, 'commit', wraps=connection.commit) as commit_mock:
+            response = self.client.patch(borrower_url, {'score': 400})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        commit_mock.assert_called_once_with()
+
+        # Ошибка после сохранения откатывает весь запрос
+        with mock.patch('credit_project.api.views.borrower.offer_index.newly_eligible_offers',
+                        side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(borrower_url, {'score': 500})
+        self.assertEqual(Borrower.objects.get(id=self.borrower.id).score, 400)
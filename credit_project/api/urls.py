@@ -1,10 +1,13 @@
 from django.conf.urls import include, url
+from django.db.transaction import non_atomic_requests
 
 from rest_framework import routers
+from rest_framework.authtoken.views import obtain_auth_token
 
 from .views import (
     BorrowerViewSet,
     CompanyViewSet,
+    CreditRequestJobView,
     CreditRequestViewSet,
     OfferViewSet,
 )
@@ -19,5 +22,8 @@ router.register(r'offers', OfferViewSet, base_name='offer')
 
 urlpatterns = [
     url(r'^$', router.get_api_root_view()),
+    url(r'^token/$', obtain_auth_token, name='token'),
+    url(r'^credit-requests/jobs/(?P<job_id>[0-9a-f]{32})/$',
+        non_atomic_requests(CreditRequestJobView.as_view()), name='credit_request-job'),
     url(r'^', include(router.urls)),
 ]
@@ -1,30 +1,27 @@
+from credit_project.loans.roles import get_user_role
+
+# Атрибуты объекта с id компании-владельца, проверка не делает запросов
 OWNER_FIELD_MAPPING = {
-    'company': ['user', ],
-    'borrower': ['company.user', ],
-    'creditrequest': ['borrower.company.user',
-                      'offer.company.user', ],
+    'company': ['id', ],
+    'borrower': ['company_id', ],
+    'creditrequest': ['borrower_company_id',
+                      'offer_company_id', ],
 }
 
 def is_owner(obj, user):
-    model_name = obj._meta.model_name
-    if model_name in OWNER_FIELD_MAPPING:
-        owner_field_list = OWNER_FIELD_MAPPING[model_name]
-
-        check_results = []
-        for owner_firld in owner_field_list:
-            check_obj = obj
-            for field in owner_firld.split('.'):
-                check_obj = getattr(check_obj, field)
-            check_results.append(check_obj == user)
+    company_id = get_user_company_id(user)
+    if company_id is None:
+        return False
+    owner_fields = OWNER_FIELD_MAPPING.get(obj._meta.model_name, [])
+    return any(getattr(obj, owner_field) == company_id for owner_field in owner_fields)
 
-        return any(check_results)
 
-    return False
+def get_user_company_id(user):
+    return get_user_role(user).company_id
 
 
 def is_credit_organization_user(user):
-    return hasattr(user, 'company') and user.company.is_credit_organization
+    return get_user_role(user).is_credit_organization
 
 def is_partner_user(user):
-    return hasattr(user, 'company') and user.company.is_partner
-
+    return get_user_role(user).is_partner
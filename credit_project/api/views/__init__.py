@@ -1,5 +1,5 @@
 from .borrower import BorrowerViewSet
 from .company import CompanyViewSet
-from .credit_request import CreditRequestViewSet
+from .credit_request import CreditRequestJobView, CreditRequestViewSet
 from .offer import OfferViewSet
 
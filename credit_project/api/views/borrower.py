@@ -1,30 +1,33 @@
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
+from credit_project.loans.importing import BorrowerImporter, read_rows
 from credit_project.loans.models import Borrower
+from credit_project.loans.offer_index import offer_index
+from credit_project.loans.tasks import CreateBorrowersOfferRequestsTask, CreateOfferRequestsTask
+from credit_project.taskapp.dispatch import enqueue
 from ..filters import BorrowerFilterSet
-from ..permissions import (
-    ListForPartnerOrSuperUser,
-    DetailForOwnerOrSuperUser,
-    EditForSuperUser,
-    DeleteForSuperUser,
-    CreateForPartnerOrSuperUser,
-)
-from ..serializers import BorrowerSerializer
-
-
-class BorrowerViewSet(ModelViewSet):
-    permission_classes = [ListForPartnerOrSuperUser,
-                          DetailForOwnerOrSuperUser,
-                          CreateForPartnerOrSuperUser,
-                          EditForSuperUser,
-                          DeleteForSuperUser, ]
+from ..permissions import ALLOW, DENY_OBJECT, OWNER, PARTNER, SUPERUSER, Policy, PolicyPermission
+from .mixins import ConditionalGetMixin, CursorPaginationMixin, NonAtomicReadMixin, SparseFieldsMixin
+from ..serializers import BorrowerImportSerializer, BorrowerSerializer
+from ..utils import get_user_company_id
+
+
+class BorrowerViewSet(NonAtomicReadMixin, SparseFieldsMixin, ConditionalGetMixin, CursorPaginationMixin,
+                      ModelViewSet):
+    permission_classes = (PolicyPermission, )
+    permission_policy = Policy({
+        SUPERUSER: {'*': ALLOW},
+        PARTNER: {'read': OWNER, 'create': ALLOW, 'update': DENY_OBJECT, 'delete': DENY_OBJECT},
+    })
     serializer_class = BorrowerSerializer
 
-    search_fields = ('last_name',
-                     'first_name',
-                     'middle_name',
-                     'phone_number',
+    # ФИО ищется по полнотекстовому индексу, номера - по search_fields
+    search_vector_field = 'search_vector'
+    search_passport_field = 'passport_number'
+    search_phone_field = 'phone_number'
+    search_fields = ('phone_number',
                      'passport_number', )
     filter_class = BorrowerFilterSet
 
@@ -32,5 +35,32 @@ class BorrowerViewSet(ModelViewSet):
         queryset = Borrower.objects.all()
         if not self.request.user.is_superuser:
             queryset = queryset.filter(
-                company=self.request.user.company)
+                company_id=get_user_company_id(self.request.user))
         return queryset
+
+    def perform_update(self, serializer):
+        previous_score = serializer.instance.score
+        borrower = serializer.save()
+        if borrower.score != previous_score:
+            # Создаем заявки только по предложениям, которые стали подходить под новый балл
+            offer_ids = offer_index.newly_eligible_offers(previous_score, borrower.score)
+            if offer_ids:
+                enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': borrower.id, 'offer_ids': offer_ids})
+
+    @action(detail=False, methods=['post'], url_path='import')
+    def import_borrowers(self, request):
+        """Загрузка анкет файлом CSV или JSONL (поле file).
+
+        Корректные строки сохраняются, для остальных возвращаются ошибки с номером строки.
+        С match=true заявки по всем загруженным анкетам создаются одной задачей.
+        """
+        serializer = BorrowerImportSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        report = BorrowerImporter(params['company_id']).run(
+            read_rows(params['file'].file, params['file_format']))
+        if params['match'] and report.created_ids:
+            enqueue(CreateBorrowersOfferRequestsTask(), kwargs={'borrower_ids': report.created_ids})
+        return Response(report.as_dict())
+
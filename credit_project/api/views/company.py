@@ -1,17 +1,23 @@
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 from credit_project.loans.models import Company
-from ..permissions import ListForCompanyOrSuperUser, DetailForOwnerOrSuperUser
+from .mixins import NonAtomicReadMixin, SparseFieldsMixin
+from ..permissions import ALLOW, CREDIT_ORGANIZATION, OWNER, PARTNER, SUPERUSER, Policy, PolicyPermission
 from ..serializers import CompanySerializer
+from ..utils import get_user_company_id
 
 
-class CompanyViewSet(ReadOnlyModelViewSet):
-    permission_classes = (ListForCompanyOrSuperUser,
-                          DetailForOwnerOrSuperUser, )
+class CompanyViewSet(NonAtomicReadMixin, SparseFieldsMixin, ReadOnlyModelViewSet):
+    permission_classes = (PolicyPermission, )
+    permission_policy = Policy({
+        SUPERUSER: {'*': ALLOW},
+        PARTNER: {'read': OWNER, '*': ALLOW},
+        CREDIT_ORGANIZATION: {'read': OWNER, '*': ALLOW},
+    })
     serializer_class = CompanySerializer
 
     def get_queryset(self):
         qs = Company.objects.all()
         if not self.request.user.is_superuser:
-            qs = qs.filter(id=self.request.user.company.id)
+            qs = qs.filter(id=get_user_company_id(self.request.user))
         return qs
@@ -1,100 +1,214 @@
-from django.db.models.query_utils import Q
-from rest_framework import permissions, status
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.views import APIView
 
 from rest_framework.viewsets import ModelViewSet
 
+from credit_project.loans.jobs import create_job, fail_job, get_coalesce_cache_key, get_idempotency_cache_key, \
+    get_job, get_public_job, wait_job
 from credit_project.loans.models import CreditRequest
 from credit_project.loans.tasks import CreateOfferRequestsTask
+from credit_project.taskapp.dispatch import enqueue
+from ..export import EXPORT_FORMATS, streaming_export_response
 from ..permissions import (
-    CreateForPartnerOrSuperUser,
-    DeleteForSuperUser,
-    DetailForOwnerOrSuperUser,
-    EditForOwnerOrSuperUser,
-    EditForSuperUserOrCreditOrganizationUser,
-    ListForCompanyOrSuperUser,
+    ALLOW,
+    CREDIT_ORGANIZATION,
+    DENY,
+    DENY_OBJECT,
+    OWNER,
+    PARTNER,
+    SUPERUSER,
+    Policy,
+    PolicyPermission,
 )
-from ..serializers import CreditRequestSerializer
-from ..utils import is_partner_user, is_credit_organization_user, is_owner
-
-
-class CreditRequestPermissions(permissions.BasePermission):
-
-    def has_permission(self, request, view):
-        # Список для суперпользователей, партнеров и кредитных организаций
-        if request.method in permissions.SAFE_METHODS:
-            return request.user.is_superuser or hasattr(request.user, 'company')
-        # Создание для суперпольвазотелей и партнеров
-        elif request.method == 'POST':
-            return request.user.is_superuser or is_partner_user(request.user)
-        return True
-
-    def has_object_permission(self, request, view, obj):
-        # Детаальная информация только для суперпользоваателей и хозяев
-        print(request.method, request.user)
-        if request.method == 'GET':
-            return request.user.is_superuser or is_owner(obj, request.user)
-        # Редактирование для суперпользоваателей
-        # и кредитных оргаанизаций к которым нааправленаа заявкаа
-        elif request.method in ['PUT', 'PATCH']:
-            return (
-                request.user.is_superuser or
-                (
-                    is_owner(obj, request.user) and
-                    is_credit_organization_user(request.user)
-                )
-            )
-        # Удаление для суперпользоваателей
-        elif request.method == 'DELETE':
-            return request.user.is_superuser
-        return False
-
-class CreditRequestViewSet(ModelViewSet):
-    permission_classes = (ListForCompanyOrSuperUser,
-                          DetailForOwnerOrSuperUser,
-                          CreateForPartnerOrSuperUser,
-                          DeleteForSuperUser,
-                          EditForOwnerOrSuperUser,
-                          EditForSuperUserOrCreditOrganizationUser, )
+from .mixins import ConditionalGetMixin, CursorPaginationMixin, NonAtomicReadMixin, SparseFieldsMixin
+from ..serializers import CreditRequestSerializer, CreditRequestTransitionSerializer
+from ..utils import get_user_company_id, is_partner_user, is_credit_organization_user
+
+
+class CreditRequestViewSet(NonAtomicReadMixin, SparseFieldsMixin, ConditionalGetMixin, CursorPaginationMixin,
+                           ModelViewSet):
+    permission_classes = (PolicyPermission, )
+    permission_policy = Policy({
+        SUPERUSER: {'*': ALLOW},
+        PARTNER: {'read': OWNER, 'create': ALLOW, 'update': DENY_OBJECT, 'delete': DENY_OBJECT},
+        CREDIT_ORGANIZATION: {'read': OWNER, 'create': DENY, 'update': OWNER, 'delete': DENY_OBJECT},
+    })
     serializer_class = CreditRequestSerializer
 
-    search_fields = ('borrower__last_name',
-                     'borrower__first_name',
-                     'borrower__middle_name',
-                     'borrower__phone_number',
+    # ФИО ищется по полнотекстовому индексу анкеты, номера - по search_fields
+    search_vector_field = 'borrower__search_vector'
+    search_passport_field = 'borrower__passport_number'
+    search_phone_field = 'borrower__phone_number'
+    search_fields = ('borrower__phone_number',
                      'borrower__passport_number',)
     filter_fields = ['status', 'offer', 'borrower']
+    # В заявку встроена анкета, поэтому ее изменение тоже меняет ответ
+    conditional_modified_fields = ('modified', 'borrower__modified')
+    # Колонки выгрузки: (название, поле для values_list)
+    export_fields = (
+        ('id', 'id'),
+        ('status', 'status'),
+        ('created', 'created'),
+        ('modified', 'modified'),
+        ('sent_date', 'sent_date'),
+        ('offer', 'offer_id'),
+        ('borrower', 'borrower_id'),
+        ('last_name', 'borrower__last_name'),
+        ('first_name', 'borrower__first_name'),
+        ('middle_name', 'borrower__middle_name'),
+        ('birth_date', 'borrower__birth_date'),
+        ('phone_number', 'borrower__phone_number'),
+        ('passport_number', 'borrower__passport_number'),
+        ('score', 'borrower__score'),
+    )
 
     def get_queryset(self):
         queryset = CreditRequest.objects.all()
+        if self.is_field_requested('borrower_detail'):
+            queryset = queryset.select_related('borrower')
+        if self.request.user.is_superuser:
+            return queryset
+
+        # Партнер видит заявки по своим анкетам, КО - по своим предложениям.
+        # Компании хранятся в самой заявке, поэтому выборка идет по одному индексу без join
+        company_id = get_user_company_id(self.request.user)
+        if is_partner_user(self.request.user):
+            return queryset.filter(borrower_company_id=company_id)
+        if is_credit_organization_user(self.request.user):
+            return queryset.filter(offer_company_id=company_id)
+        return queryset.none()
+
+    def get_conditional_modified_fields(self):
+        # Без встроенной анкеты ответ от нее не зависит, и агрегат списка обходится без join
+        if not self.is_field_requested('borrower_detail'):
+            return ('modified', )
+        return super().get_conditional_modified_fields()
 
-        if not self.request.user.is_superuser:
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """Выгрузка всех доступных заявок (с учетом фильтров) в CSV или NDJSON (file_format=ndjson).
 
-            q_objects = Q()
-            if is_partner_user(self.request.user):
-                q_objects |= Q(
-                    borrower__company_id=self.request.user.company.id)
-            if is_credit_organization_user(self.request.user):
-                q_objects |= Q(
-                    offer__company_id=self.request.user.company.id)
+        Ответ отдается потоком, строки читаются из БД серверным курсором,
+        поэтому расход памяти не зависит от количества заявок.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError({'file_format': ['Допустимые форматы: {}'.format(', '.join(EXPORT_FORMATS))]})
+        queryset = self.filter_queryset(self.get_queryset())
+        return streaming_export_response(queryset, self.export_fields, file_format, 'credit_requests')
+
+    @action(detail=False, methods=['patch'])
+    def transition(self, request):
+        """Массовый перевод заявок в статус: {"ids": [...], "status": "approved"}.
+
+        Права - как на редактирование заявки: КО переводит только заявки по своим предложениям.
+        Заявки, которых нет среди доступных или из статуса которых переход не допустим,
+        возвращаются в skipped.
+        """
+        if self.permission_rule not in (ALLOW, OWNER):
+            raise PermissionDenied()
+        serializer = CreditRequestTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids, new_status = serializer.validated_data['ids'], serializer.validated_data['status']
 
-            if q_objects:
-                queryset = queryset.filter(q_objects)
-            else:
-                queryset = queryset.none()
+        updated = self.get_queryset().transition(ids, new_status)
+        updated_ids = set(updated)
+        return Response({
+            'status': new_status,
+            'updated': sorted(updated_ids),
+            'skipped': sorted(set(ids) - updated_ids),
+        })
 
-        return queryset
+    def dispatch(self, request, *args, **kwargs):
+        """Задача создания заявок отправляется после коммита транзакции запроса.
+        Если транзакция откачена или коммит не удался, задание из perform_create никогда не выполнится:
+        оно помечается неуспешным, а его ключи освобождаются, чтобы повтор запроса создал новое.
+        Внутри внешней транзакции (например, в тестах) коммит происходит позже, и проверка не выполняется.
+        """
+        self.uncommitted_job = None
+        outermost = not transaction.get_connection().in_atomic_block
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if outermost and self.uncommitted_job is not None:
+                fail_job(*self.uncommitted_job)
 
     def create(self, request, *args, **kwargs):
+        """Заявки создаются асинхронно, в ответе - id задания и адрес его статуса"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        return Response(status=status.HTTP_201_CREATED)
+        job_id = self.perform_create(serializer)
+        return Response({
+            'job': job_id,
+            'job_url': reverse('api:credit_request-job', kwargs={'job_id': job_id}, request=request),
+        }, status=status.HTTP_201_CREATED)
 
     def perform_create(self, serializer):
+        """Повторная отправка с тем же заголовком Idempotency-Key и повторы по той же анкете
+        и предложению в пределах CREDIT_REQUEST_COALESCE_WINDOW возвращают уже поставленное задание,
+        новая задача в очередь не отправляется.
+        """
         borrower = serializer.validated_data['borrower']
         offer = serializer.validated_data.get('offer', None)
-        CreateOfferRequestsTask().delay(
-            borrower_id=borrower.id,
-            offer_id=offer.id if offer else None,
-        )
+        params = {'borrower_id': borrower.id, 'offer_id': offer.id if offer else None}
+        claim_keys = self.get_job_claim_keys(params)
+        job_id, created = create_job(self.request.user.pk, params, claim_keys)
+        if not created:
+            job = get_job(job_id)
+            if job is not None and job['params'] != params:
+                raise ValidationError({'idempotency_key': ['Ключ уже использован для другого запроса']})
+            return job_id
+        self.uncommitted_job = (job_id, claim_keys)
+        transaction.on_commit(self.job_committed)
+        enqueue(CreateOfferRequestsTask(), kwargs={
+            'borrower_id': borrower.id,
+            'offer_id': offer.id if offer else None,
+            'job_id': job_id,
+        }, on_error=lambda: fail_job(job_id, claim_keys))
+        return job_id
+
+    def job_committed(self):
+        self.uncommitted_job = None
+
+    def get_job_claim_keys(self, params):
+        user_id = self.request.user.pk
+        claim_keys = []
+        idempotency_key = self.request.META.get('HTTP_IDEMPOTENCY_KEY')
+        if idempotency_key:
+            claim_keys.append((get_idempotency_cache_key(user_id, idempotency_key),
+                               settings.CREDIT_REQUEST_IDEMPOTENCY_TIMEOUT))
+        if settings.CREDIT_REQUEST_COALESCE_WINDOW:
+            claim_keys.append((get_coalesce_cache_key(user_id, params['borrower_id'], params['offer_id']),
+                               settings.CREDIT_REQUEST_COALESCE_WINDOW))
+        return claim_keys
+
+
+class CreditRequestJobView(APIView):
+    """Статус задания создания заявок: state (pending/success/failure), created и ids созданных заявок.
+
+    ?wait=N - подождать завершения задания до N секунд (не больше CREDIT_REQUEST_JOB_MAX_WAIT).
+    Статус читается из кэша, запросов к БД нет; задание видно только создавшему его пользователю.
+    Вьюха подключается без транзакции запроса (см. urls), чтобы ожидание не держало транзакцию.
+    """
+
+    def get(self, request, job_id):
+        job = get_job(job_id)
+        if job is None or (job['user_id'] != request.user.pk and not request.user.is_superuser):
+            raise NotFound()
+        wait = self.get_wait(request)
+        if wait:
+            job = wait_job(job_id, wait) or job
+        return Response(get_public_job(job))
+
+    def get_wait(self, request):
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            raise ValidationError({'wait': ['Укажите число секунд']})
+        return min(max(wait, 0), settings.CREDIT_REQUEST_JOB_MAX_WAIT)
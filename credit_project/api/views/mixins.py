@@ -0,0 +1,171 @@
+import calendar
+import hashlib
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils.decorators import classonlymethod
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from ..pagination import CreatedIdCursorPagination
+
+
+class NonAtomicReadMixin:
+    """Чтение (GET, HEAD, OPTIONS) выполняется без транзакции запроса (ATOMIC_REQUESTS):
+    не нужны лишние BEGIN/COMMIT, и соединение не держится открытой транзакцией.
+    Изменяющие запросы по-прежнему выполняются в транзакции целиком, включая обработку ошибок.
+
+    Если запрос уже выполняется внутри транзакции (например, в тестах), чтение тоже
+    идет в savepoint, как раньше.
+    """
+
+    @classonlymethod
+    def as_view(cls, *args, **kwargs):
+        return transaction.non_atomic_requests(super().as_view(*args, **kwargs))
+
+    def dispatch(self, request, *args, **kwargs):
+        connection = transaction.get_connection()
+        if not connection.settings_dict['ATOMIC_REQUESTS'] or (
+                request.method in SAFE_METHODS and not connection.in_atomic_block):
+            return super().dispatch(request, *args, **kwargs)
+        with transaction.atomic():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class CursorPaginationMixin:
+    """Если в запросе передан параметр cursor, список отдается keyset-пагинацией
+    (для машинных клиентов), иначе - обычной постраничной.
+    """
+    cursor_pagination_class = CreatedIdCursorPagination
+
+    @property
+    def paginator(self):
+        if (not hasattr(self, '_paginator') and
+                self.cursor_pagination_class.cursor_query_param in self.request.query_params):
+            self._paginator = self.cursor_pagination_class()
+        return super().paginator
+
+
+class SparseFieldsMixin:
+    """Набор полей ответа на GET из параметров запроса:
+    ?fields=id,status,offer - только перечисленные поля,
+    ?expand=borrower - плюс вложенные объекты из expandable_fields сериализатора.
+
+    Запрошенные поля передаются сериализатору (см. serializers.mixins.SparseFieldsMixin),
+    а get_queryset может по is_field_requested не загружать данные для не запрошенных полей.
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    def get_requested_fields(self):
+        """Множество запрошенных полей или None, если нужны все поля"""
+        if self.request is None or self.request.method not in SAFE_METHODS:
+            return None
+        fields = self.request.query_params.get(self.fields_query_param)
+        if not fields:
+            return None
+        requested_fields = {field_name.strip() for field_name in fields.split(',')}
+        expandable_fields = getattr(self.get_serializer_class(), 'expandable_fields', {})
+        for name in self.request.query_params.get(self.expand_query_param, '').split(','):
+            if name.strip() in expandable_fields:
+                requested_fields.add(expandable_fields[name.strip()])
+        return requested_fields
+
+    def is_field_requested(self, field_name):
+        requested_fields = self.get_requested_fields()
+        return requested_fields is None or field_name in requested_fields
+
+    def get_serializer(self, *args, **kwargs):
+        kwargs.setdefault('fields', self.get_requested_fields())
+        return super().get_serializer(*args, **kwargs)
+
+
+class ConditionalGetMixin:
+    """ETag и Last-Modified для списка и детальной информации, 304 Not Modified по ним.
+
+    Валидаторы считаются без сериализации ответа: для списка - по max(modified)
+    и количеству объектов отфильтрованного queryset (плюс адрес запроса и пользователь),
+    для объекта - по его modified. В conditional_modified_fields перечисляются поля
+    с моментом изменения, от которых зависит представление объекта.
+    Для keyset-пагинации (?cursor=) агрегат по всему queryset не считается - это вернуло бы
+    полный проход, от которого она избавляет: валидаторы считаются по строкам страницы.
+    """
+    conditional_modified_fields = ('modified', )
+
+    def list(self, request, *args, **kwargs):
+        if isinstance(self.paginator, CreatedIdCursorPagination):
+            page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+            etag, last_modified = self.get_page_validators(request, page)
+            return self.get_conditional_response(request, etag, last_modified, self.get_page_response, page)
+        etag, last_modified = self.get_list_validators(request)
+        return self.get_conditional_response(request, etag, last_modified,
+                                             self.get_list_response, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        last_modified = self.get_instance_last_modified(instance)
+        etag = self.make_etag(request, instance._meta.label, instance.pk, last_modified)
+        return self.get_conditional_response(request, etag, last_modified,
+                                             self.get_retrieve_response, instance)
+
+    def get_list_response(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
+    def get_page_response(self, page):
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    def get_retrieve_response(self, instance):
+        serializer = self.get_serializer(instance)
+        return Response(serializer.data)
+
+    def get_conditional_modified_fields(self):
+        return self.conditional_modified_fields
+
+    def get_list_validators(self, request):
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        modified_fields = self.get_conditional_modified_fields()
+        aggregates = queryset.aggregate(
+            count=Count('pk'),
+            **{'last_modified_{}'.format(i): Max(field)
+               for i, field in enumerate(modified_fields)}
+        )
+        last_modified = max(filter(None, (aggregates['last_modified_{}'.format(i)]
+                                          for i in range(len(modified_fields)))),
+                            default=None)
+        etag = self.make_etag(request, queryset.model._meta.label, aggregates['count'], last_modified)
+        return etag, last_modified
+
+    def get_page_validators(self, request, page):
+        last_modified = max(filter(None, (self.get_instance_last_modified(instance) for instance in page)),
+                            default=None)
+        etag = self.make_etag(request, self.get_queryset().model._meta.label,
+                              [instance.pk for instance in page], last_modified)
+        return etag, last_modified
+
+    def get_instance_last_modified(self, instance):
+        values = []
+        for field in self.get_conditional_modified_fields():
+            value = instance
+            for attr in field.split('__'):
+                value = getattr(value, attr)
+            values.append(value)
+        return max(filter(None, values), default=None)
+
+    def make_etag(self, request, *parts):
+        parts = [request.build_absolute_uri(), request.user.pk] + [
+            part.isoformat() if hasattr(part, 'isoformat') else part for part in parts]
+        return quote_etag(hashlib.md5(repr(parts).encode('utf-8')).hexdigest())
+
+    def get_conditional_response(self, request, etag, last_modified, get_response, *args, **kwargs):
+        timestamp = calendar.timegm(last_modified.utctimetuple()) if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = get_response(*args, **kwargs)
+        if etag is not None and not response.has_header('ETag'):
+            response['ETag'] = etag
+        if timestamp is not None and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(timestamp)
+        return response
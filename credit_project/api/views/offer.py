@@ -1,14 +1,20 @@
+from rest_framework.response import Response
 from rest_framework.viewsets import ReadOnlyModelViewSet
 
 from credit_project.loans.models import Offer
+from ..cache import offer_catalog_cache
+from .mixins import ConditionalGetMixin, NonAtomicReadMixin, SparseFieldsMixin
 from ..filters import OfferFilterSet
-from ..permissions import ListForPartnerOrSuperUser
+from ..permissions import ALLOW, PARTNER, SUPERUSER, Policy, PolicyPermission
 from ..serializers import OfferSerializer
 
 
-class OfferViewSet(ReadOnlyModelViewSet):
-    permission_classes = [ListForPartnerOrSuperUser,
-                          ]
+class OfferViewSet(NonAtomicReadMixin, SparseFieldsMixin, ConditionalGetMixin, ReadOnlyModelViewSet):
+    permission_classes = (PolicyPermission, )
+    permission_policy = Policy({
+        SUPERUSER: {'*': ALLOW},
+        PARTNER: {'*': ALLOW},
+    })
     serializer_class = OfferSerializer
 
     search_fields = ('name', )
@@ -19,3 +25,22 @@ class OfferViewSet(ReadOnlyModelViewSet):
         if not self.request.user.is_superuser:
             qs = qs.active()
         return qs
+
+    def get_list_validators(self, request):
+        # Каталог для партнеров проверяется по версии кэша, без запросов к предложениям
+        if request.user.is_superuser:
+            return super().get_list_validators(request)
+        return offer_catalog_cache.get_etag(request), None
+
+    def get_list_response(self, request, *args, **kwargs):
+        # Каталог активных предложений одинаков для всех партнеров и кэшируется целиком
+        if request.user.is_superuser:
+            return super().get_list_response(request, *args, **kwargs)
+        data = offer_catalog_cache.get(request)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+        response = super().get_list_response(request, *args, **kwargs)
+        if response.status_code == 200:
+            offer_catalog_cache.set(request, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -61,8 +61,8 @@ class CreditRequestAdmin(admin.ModelAdmin):
     list_display = ('id', 'status', 'borrower', 'offer', 'created', 'sent_date')
     list_filter = ('status', 'borrower', 'offer')
     search_fields = ('borrower__last_name', 'borrower__first_name', 'borrower__middle_name')
-    fields = ('id', 'status', 'created', 'sent_date', 'borrower', 'offer')
-    readonly_fields = ('id', 'created')
+    fields = ('id', 'status', 'created', 'modified', 'sent_date', 'borrower', 'offer')
+    readonly_fields = ('id', 'created', 'modified')
     raw_id_fields = ('borrower', 'offer')
     list_select_related = ('borrower', 'offer')
 
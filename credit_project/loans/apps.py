@@ -5,3 +5,6 @@ from django.utils.translation import ugettext_lazy as _
 class LoansConfig(AppConfig):
     name = 'credit_project.loans'
     verbose_name = _("Кредитование")
+
+    def ready(self):
+        from . import signals  # noqa F401
@@ -0,0 +1,179 @@
+import csv
+import io
+import itertools
+import json
+
+import numpy as np
+import phonenumbers
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import Borrower
+
+# Поля анкеты в файле импорта
+IMPORT_FIELDS = ('last_name', 'first_name', 'middle_name', 'birth_date',
+                 'phone_number', 'passport_number', 'score')
+
+# Колонки COPY; search_vector заполняет триггер
+COPY_COLUMNS = ('id', 'created', 'modified') + IMPORT_FIELDS + ('company_id', )
+
+PHONE_REGION = 'RU'
+MAX_SCORE = 32767
+
+FORMATS = ('csv', 'jsonl')
+
+
+def read_rows(fileobj, file_format):
+    """Построчно читает бинарный файл импорта, возвращает пары (номер строки, словарь полей).
+
+    Для CSV первая строка - заголовок с названиями полей. Номера строк - номера записей, начиная с 1.
+    """
+    lines = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        return enumerate(csv.DictReader(lines), start=1)
+    if file_format == 'jsonl':
+        return ((line_number, parse_json_line(line))
+                for line_number, line in enumerate(lines, start=1) if line.strip())
+    raise ValueError('Неизвестный формат файла: {}'.format(file_format))
+
+
+def parse_json_line(line):
+    try:
+        row = json.loads(line)
+    except ValueError:
+        return None
+    return row if isinstance(row, dict) else None
+
+
+def guess_format(file_name):
+    extension = file_name.rsplit('.', 1)[-1].lower() if file_name else ''
+    return {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}.get(extension)
+
+
+class BorrowerImportReport:
+
+    def __init__(self):
+        self.created_ids = []
+        self.errors = []
+
+    @property
+    def created(self):
+        return len(self.created_ids)
+
+    def as_dict(self):
+        return {'created': self.created, 'errors': self.errors}
+
+
+class BorrowerImporter:
+    """Потоковый импорт анкет одной компании.
+
+    Строки читаются и проверяются пачками по batch_size: номера паспортов проверяются
+    numpy-массивом на всю пачку, телефоны разбираются по одному разу на уникальный номер.
+    Id для корректных строк выделяются из последовательности одним запросом,
+    сами строки пишутся в таблицу через COPY.
+    """
+
+    def __init__(self, company_id, batch_size=5000):
+        self.company_id = company_id
+        self.batch_size = batch_size
+        self._phone_numbers = {}
+
+    def run(self, rows):
+        report = BorrowerImportReport()
+        rows = iter(rows)
+        with transaction.atomic():
+            while True:
+                batch = list(itertools.islice(rows, self.batch_size))
+                if not batch:
+                    break
+                valid_rows = self.validate_batch(batch, report)
+                if valid_rows:
+                    report.created_ids.extend(self.copy_rows(valid_rows))
+        return report
+
+    def validate_batch(self, batch, report):
+        """Возвращает список проверенных строк (кортежи значений IMPORT_FIELDS),
+        ошибки добавляет в отчет.
+        """
+        passports = np.array([str((row or {}).get('passport_number') or '') for _, row in batch])
+        passports_valid = (np.char.str_len(passports) == 10) & np.char.isdecimal(passports)
+
+        valid_rows = []
+        for (line_number, row), passport_valid in zip(batch, passports_valid):
+            if row is None:
+                report.errors.append({'row': line_number, 'errors': {'non_field_errors': ['Не удалось разобрать строку']}})
+                continue
+            values, errors = self.clean_row(row)
+            if not passport_valid:
+                errors['passport_number'] = ['Не верный номер паспорта. Укажите его в формате 9999999999']
+            if errors:
+                report.errors.append({'row': line_number, 'errors': errors})
+            else:
+                valid_rows.append(values)
+        return valid_rows
+
+    def clean_row(self, row):
+        errors = {}
+        values = {}
+        for field in ('last_name', 'first_name', 'middle_name'):
+            value = str(row.get(field) or '').strip()
+            if not value:
+                errors[field] = ['Обязательное поле']
+            elif len(value) > 255:
+                errors[field] = ['Не более 255 символов']
+            values[field] = value
+
+        try:
+            values['birth_date'] = parse_date(str(row.get('birth_date') or ''))
+        except ValueError:
+            values['birth_date'] = None
+        if values['birth_date'] is None:
+            errors['birth_date'] = ['Укажите дату в формате ГГГГ-ММ-ДД']
+
+        values['phone_number'] = self.normalize_phone_number(str(row.get('phone_number') or ''))
+        if values['phone_number'] is None:
+            errors['phone_number'] = ['Не верный номер телефона']
+
+        values['passport_number'] = str(row.get('passport_number') or '')
+
+        try:
+            values['score'] = int(row.get('score'))
+        except (TypeError, ValueError):
+            values['score'] = None
+        if values['score'] is None or not 0 <= values['score'] <= MAX_SCORE:
+            errors['score'] = ['Укажите целое число от 0 до {}'.format(MAX_SCORE)]
+
+        return tuple(values[field] for field in IMPORT_FIELDS), errors
+
+    def normalize_phone_number(self, value):
+        """Номер в формате E.164 или None; результат разбора запоминается на время импорта"""
+        if value not in self._phone_numbers:
+            try:
+                phone_number = phonenumbers.parse(value, PHONE_REGION)
+            except phonenumbers.NumberParseException:
+                normalized = None
+            else:
+                normalized = (phonenumbers.format_number(phone_number, phonenumbers.PhoneNumberFormat.E164)
+                              if phonenumbers.is_valid_number(phone_number) else None)
+            self._phone_numbers[value] = normalized
+        return self._phone_numbers[value]
+
+    def copy_rows(self, rows):
+        """Пишет строки через COPY, возвращает id созданных анкет"""
+        table = Borrower._meta.db_table
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                           [table, len(rows)])
+            ids = [row[0] for row in cursor.fetchall()]
+
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for borrower_id, values in zip(ids, rows):
+                writer.writerow((borrower_id, now, now) + values + (self.company_id, ))
+            buffer.seek(0)
+            cursor.copy_expert('COPY {} ({}) FROM STDIN WITH (FORMAT csv)'.format(
+                connection.ops.quote_name(table),
+                ', '.join(connection.ops.quote_name(column) for column in COPY_COLUMNS)), buffer)
+        return ids
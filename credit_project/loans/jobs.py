@@ -0,0 +1,102 @@
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+JOB_CACHE_KEY = 'loans:job:{}'
+IDEMPOTENCY_CACHE_KEY = 'loans:job_idempotency:{}:{}'
+COALESCE_CACHE_KEY = 'loans:job_coalesce:{}:{}:{}'
+
+# Служебные поля записи задания, которые не отдаются клиентам
+JOB_PRIVATE_FIELDS = ('user_id', 'params')
+
+# Состояния задания
+PENDING = 'pending'
+SUCCESS = 'success'
+FAILURE = 'failure'
+
+
+def create_job(user_id, params=None, claim_keys=()):
+    """Заводит запись о задании создания заявок, возвращает (id задания, создано ли новое задание).
+
+    Запись компактная: состояние, id пользователя, параметры запроса, количество и id созданных заявок.
+    Ее пишет задача, а читает эндпоинт статуса, поэтому клиентам не нужно опрашивать список заявок.
+
+    claim_keys - пары (ключ кэша, время жизни), см. get_idempotency_cache_key и get_coalesce_cache_key.
+    Если под одним из ключей уже есть живое (не истекшее и не упавшее) задание,
+    новое не создается и возвращается существующее.
+    Ключи занимаются через cache.add, поэтому из параллельных запросов задание создает только один.
+    """
+    job_id = uuid.uuid4().hex
+    # Запись пишется до ключей: тот, кто прочитает ключ, сразу увидит живое задание
+    cache.set(JOB_CACHE_KEY.format(job_id), {'state': PENDING, 'user_id': user_id, 'params': params},
+              settings.CREDIT_REQUEST_JOB_TIMEOUT)
+    claimed_keys = []
+    for key, timeout in claim_keys:
+        if not cache.add(key, job_id, timeout):
+            existing_job_id = cache.get(key)
+            existing_job = get_job(existing_job_id) if existing_job_id is not None else None
+            if existing_job is not None and existing_job['state'] != FAILURE:
+                cache.delete(JOB_CACHE_KEY.format(job_id))
+                # Уже занятые ключи тоже указывают на существующее задание
+                for claimed_key, claimed_timeout in claimed_keys:
+                    cache.set(claimed_key, existing_job_id, claimed_timeout)
+                return existing_job_id, False
+            # Задание по ключу истекло или завершилось ошибкой - повтор создает новое
+            cache.set(key, job_id, timeout)
+        claimed_keys.append((key, timeout))
+    return job_id, True
+
+
+def get_idempotency_cache_key(user_id, idempotency_key):
+    """Ключ заголовка Idempotency-Key, свой у каждого пользователя. В ключе кэша - хэш заголовка"""
+    return IDEMPOTENCY_CACHE_KEY.format(user_id, hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest())
+
+
+def get_coalesce_cache_key(user_id, borrower_id, offer_id=None):
+    """Ключ склейки повторных запросов пользователя по той же анкете и предложению (или всем предложениям)"""
+    return COALESCE_CACHE_KEY.format(user_id, borrower_id, offer_id or 'all')
+
+
+def get_job(job_id):
+    return cache.get(JOB_CACHE_KEY.format(job_id))
+
+
+def get_public_job(job):
+    return {key: value for key, value in job.items() if key not in JOB_PRIVATE_FIELDS}
+
+
+def finish_job(job_id, created_ids, state=SUCCESS):
+    job = get_job(job_id)
+    if job is None:
+        return
+    job.update(state=state, created=len(created_ids), ids=sorted(created_ids))
+    cache.set(JOB_CACHE_KEY.format(job_id), job, settings.CREDIT_REQUEST_JOB_TIMEOUT)
+
+
+def fail_job(job_id, claim_keys=()):
+    """Помечает незавершенное задание неуспешным и освобождает его ключи (см. create_job),
+    чтобы повторный запрос клиента создал новое задание, а не вернул это
+    """
+    job = get_job(job_id)
+    if job is not None and job['state'] == PENDING:
+        finish_job(job_id, [], state=FAILURE)
+    for key, _ in claim_keys:
+        if cache.get(key) == job_id:
+            cache.delete(key)
+
+
+def wait_job(job_id, timeout, poll_interval=None):
+    """Ждет завершения задания не дольше timeout секунд, возвращает запись задания.
+
+    Ожидание - опрос записи в кэше (одно чтение ключа), без запросов к БД.
+    """
+    poll_interval = poll_interval or settings.CREDIT_REQUEST_JOB_POLL_INTERVAL
+    deadline = time.monotonic() + timeout
+    job = get_job(job_id)
+    while job is not None and job['state'] == PENDING and time.monotonic() < deadline:
+        time.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+        job = get_job(job_id)
+    return job
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from credit_project.loans.importing import FORMATS, BorrowerImporter, guess_format, read_rows
+from credit_project.loans.models import Company
+from credit_project.loans.tasks import CreateBorrowersOfferRequestsTask
+from credit_project.taskapp.dispatch import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Импортирует анкеты компании из CSV или JSONL файла'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Путь к файлу')
+        parser.add_argument('--company', type=int, required=True, help='id компании-партнера')
+        parser.add_argument('--format', dest='file_format', choices=FORMATS,
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Сколько строк проверять и записывать за один раз')
+        parser.add_argument('--match', action='store_true',
+                            help='Создать заявки по подходящим предложениям для всех загруженных анкет')
+
+    def handle(self, *args, **options):
+        if not Company.objects.filter(id=options['company']).exists():
+            raise CommandError('Компания {} не найдена'.format(options['company']))
+        file_format = options['file_format'] or guess_format(options['path'])
+        if file_format is None:
+            raise CommandError('Не удалось определить формат файла, укажите --format')
+
+        importer = BorrowerImporter(options['company'], batch_size=options['batch_size'])
+        with open(options['path'], 'rb') as fileobj:
+            report = importer.run(read_rows(fileobj, file_format))
+
+        for error in report.errors:
+            self.stderr.write('Строка {}: {}'.format(error['row'], error['errors']))
+        self.stdout.write('Создано анкет: {}, строк с ошибками: {}'.format(report.created, len(report.errors)))
+
+        if options['match'] and report.created_ids:
+            enqueue(CreateBorrowersOfferRequestsTask(), kwargs={'borrower_ids': report.created_ids})
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from credit_project.loans.matching import BorrowerScores, create_credit_requests_for_offers
+from credit_project.loans.models import Offer
+
+
+class Command(BaseCommand):
+    help = 'Создает заявки по всем анкетам, подходящим под предложения (по умолчанию - под все активные)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offer', dest='offer_ids', type=int, action='append',
+                            help='id предложения, можно указать несколько раз')
+        parser.add_argument('--chunk-size', type=int, default=100000,
+                            help='Сколько анкет читать из БД за одну порцию')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Сколько заявок вставлять одним запросом')
+
+    def handle(self, *args, **options):
+        if options['offer_ids']:
+            offers = Offer.objects.filter(id__in=options['offer_ids'])
+        else:
+            offers = Offer.objects.active()
+        offers = list(offers.only('id', 'min_score', 'max_score', 'company_id'))
+        if not offers:
+            self.stdout.write('Нет предложений для подбора')
+            return
+
+        borrower_scores = BorrowerScores.load(chunk_size=options['chunk_size'])
+        self.stdout.write('Загружено анкет: {}'.format(len(borrower_scores)))
+
+        created = create_credit_requests_for_offers(borrower_scores, offers,
+                                                    batch_size=options['batch_size'])
+        for offer_id, count in created.items():
+            self.stdout.write('Предложение {}: создано заявок {}'.format(offer_id, count))
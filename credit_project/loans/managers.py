@@ -1,17 +1,18 @@
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import sql
 from django.utils import timezone
 
 
 class OfferQuerySet(models.QuerySet):
 
-    def active(self):
+    def active(self, now=None):
         # Предположил, что ротация - это промежуток времени, когда кредитное предложение актуально.
         # Соответственно фильтруем предложения по данным полям.
-        now = timezone.now()
+        now = now or timezone.now()
         return self.filter(rotation_start__lte=now, rotation_end__gte=now)
 
-    def not_active(self):
-        now = timezone.now()
+    def not_active(self, now=None):
+        now = now or timezone.now()
         return self.exclude(rotation_start__lte=now, rotation_end__gte=now)
 
 
@@ -20,8 +21,91 @@ class OfferManager(models.Manager):
     def get_queryset(self):
         return OfferQuerySet(self.model, using=self._db)
 
-    def active(self):
-        return self.get_queryset().active()
+    def active(self, now=None):
+        return self.get_queryset().active(now)
 
-    def not_active(self):
-        return self.get_queryset().not_active()
+    def not_active(self, now=None):
+        return self.get_queryset().not_active(now)
+
+
+class CreditRequestQuerySet(models.QuerySet):
+
+    def bulk_create_ignore_conflicts(self, objs, batch_size=1000):
+        """Аналог bulk_create, который пропускает заявки, нарушающие уникальность
+        (например, уже созданные по той же паре анкета/предложение).
+        Возвращает список id действительно созданных заявок.
+        Не заполненные у заявок компании анкеты и предложения загружаются из БД.
+        """
+        self.fill_owner_companies(objs)
+        connection = connections[self.db]
+        qn = connection.ops.quote_name
+        fields = [field for field in self.model._meta.concrete_fields
+                  if not isinstance(field, models.AutoField)]
+        sql_template = 'INSERT INTO {table} ({columns}) VALUES {{values}} ON CONFLICT DO NOTHING RETURNING {pk}'.format(
+            table=qn(self.model._meta.db_table),
+            columns=', '.join(qn(field.column) for field in fields),
+            pk=qn(self.model._meta.pk.column),
+        )
+        row_placeholder = '({})'.format(', '.join(['%s'] * len(fields)))
+
+        created_ids = []
+        with transaction.atomic(using=self.db, savepoint=False), connection.cursor() as cursor:
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start:start + batch_size]
+                params = [field.get_db_prep_save(field.pre_save(obj, True), connection)
+                          for obj in batch for field in fields]
+                cursor.execute(sql_template.format(values=', '.join([row_placeholder] * len(batch))),
+                               params)
+                created_ids.extend(row[0] for row in cursor.fetchall())
+        return created_ids
+
+    def fill_owner_companies(self, objs):
+        """Заполняет borrower_company_id и offer_company_id по анкетам и предложениям заявок"""
+        for field_name in ('borrower', 'offer'):
+            related_model = self.model._meta.get_field(field_name).related_model
+            id_attr, company_attr = field_name + '_id', field_name + '_company_id'
+            missing_ids = {getattr(obj, id_attr) for obj in objs if getattr(obj, company_attr) is None}
+            if not missing_ids:
+                continue
+            company_ids = dict(related_model.objects.using(self.db).filter(
+                id__in=missing_ids).values_list('id', 'company_id'))
+            for obj in objs:
+                if getattr(obj, company_attr) is None:
+                    setattr(obj, company_attr, company_ids.get(getattr(obj, id_attr)))
+
+    def transition(self, ids, status, now=None):
+        """Переводит заявки ids (из числа заявок queryset) в статус status.
+
+        Переводятся только заявки, из текущего статуса которых переход допустим
+        (CreditRequest.STATUS_TRANSITIONS), одним UPDATE ... WHERE id IN (...) AND status IN (...).
+        Проверка статуса выполняется в том же запросе, поэтому конкурентные переходы
+        одной заявки не проходят дважды. Возвращает список id переведенных заявок.
+        """
+        if not ids:
+            return []
+        now = now or timezone.now()
+        values = {'status': status, 'modified': now}
+        if status == self.model.STATUSES.sent:
+            values['sent_date'] = now
+
+        queryset = self.filter(id__in=ids, status__in=self.model.STATUS_TRANSITIONS[status])
+        query = queryset.query.clone(sql.UpdateQuery)
+        query.add_update_values(values)
+        update_sql, params = query.get_compiler(self.db).as_sql()
+        connection = connections[self.db]
+        with transaction.atomic(using=self.db, savepoint=False), connection.cursor() as cursor:
+            cursor.execute('{} RETURNING {}'.format(
+                update_sql, connection.ops.quote_name(self.model._meta.pk.column)), params)
+            return [row[0] for row in cursor.fetchall()]
+
+
+class CreditRequestManager(models.Manager):
+
+    def get_queryset(self):
+        return CreditRequestQuerySet(self.model, using=self._db)
+
+    def bulk_create_ignore_conflicts(self, objs, batch_size=1000):
+        return self.get_queryset().bulk_create_ignore_conflicts(objs, batch_size)
+
+    def transition(self, ids, status, now=None):
+        return self.get_queryset().transition(ids, status, now)
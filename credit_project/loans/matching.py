@@ -0,0 +1,147 @@
+import itertools
+
+import numpy as np
+from django.db.models import Q
+
+from .models import Borrower, CreditRequest
+
+
+class BorrowerScores:
+    """Компактный снимок анкет для массового подбора предложений.
+
+    Хранит id анкет и их баллы в numpy-массивах, отсортированных по баллу,
+    поэтому анкеты, подходящие под интервал [min_score, max_score], -
+    это непрерывный срез, который находится двумя бинарными поисками.
+    """
+
+    def __init__(self, ids, scores):
+        order = np.argsort(scores, kind='mergesort')
+        self.ids = ids[order]
+        self.scores = scores[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def load(cls, queryset=None, chunk_size=100000):
+        """Загружает анкеты из БД порциями по chunk_size строк через серверный курсор"""
+        if queryset is None:
+            queryset = Borrower.objects.all()
+        rows = queryset.order_by().values_list('id', 'score').iterator()
+
+        id_chunks, score_chunks = [], []
+        while True:
+            chunk = np.fromiter((value for row in itertools.islice(rows, chunk_size) for value in row),
+                                dtype=np.int64)
+            if not len(chunk):
+                break
+            id_chunks.append(chunk[0::2].astype(np.int32))
+            score_chunks.append(chunk[1::2].astype(np.uint16))
+
+        if not id_chunks:
+            return cls(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16))
+        return cls(np.concatenate(id_chunks), np.concatenate(score_chunks))
+
+    def eligible(self, min_score, max_score):
+        """id анкет с min_score <= score <= max_score"""
+        start = np.searchsorted(self.scores, min_score, side='left')
+        end = np.searchsorted(self.scores, max_score, side='right')
+        return self.ids[start:end]
+
+    def eligible_for_offers(self, offers):
+        """Для каждого предложения возвращает пару (id предложения, массив id подходящих анкет).
+
+        Границы срезов для всех предложений считаются одним вызовом searchsorted.
+        """
+        offers = list(offers)
+        if not offers:
+            return []
+        min_scores = np.array([offer.min_score for offer in offers])
+        max_scores = np.array([offer.max_score for offer in offers])
+        starts = np.searchsorted(self.scores, min_scores, side='left')
+        ends = np.searchsorted(self.scores, max_scores, side='right')
+        return [(offer.id, self.ids[start:end]) for offer, start, end in zip(offers, starts, ends)]
+
+
+def create_credit_requests_for_offers(borrower_scores, offers, batch_size=5000):
+    """Создает заявки по всем подходящим анкетам для каждого из предложений.
+
+    Существующие заявки пропускаются. Возвращает словарь {id предложения: количество созданных заявок}.
+    """
+    offers = list(offers)
+    offer_company_ids = {offer.id: offer.company_id for offer in offers}
+    created = {}
+    for offer_id, borrower_ids in borrower_scores.eligible_for_offers(offers):
+        created[offer_id] = 0
+        for start in range(0, len(borrower_ids), batch_size):
+            # Компании анкет в снимке не хранятся и догружаются при вставке одним запросом на пачку
+            credit_requests = [CreditRequest(borrower_id=borrower_id, offer_id=offer_id,
+                                             offer_company_id=offer_company_ids[offer_id])
+                               for borrower_id in borrower_ids[start:start + batch_size].tolist()]
+            created[offer_id] += len(
+                CreditRequest.objects.bulk_create_ignore_conflicts(credit_requests, batch_size))
+    return created
+
+
+def create_credit_requests_for_score_intervals(offer_id, intervals, batch_size=5000):
+    """Создает заявки по предложению для анкет, балл которых попадает в один из интервалов.
+
+    Анкеты выбираются по индексу на score, полный перебор анкет не нужен.
+    Возвращает количество созданных заявок.
+    """
+    if not intervals:
+        return 0
+    score_q = Q()
+    for min_score, max_score in intervals:
+        score_q |= Q(score__gte=min_score, score__lte=max_score)
+    borrowers = Borrower.objects.filter(score_q).order_by().values_list('id', 'company_id').iterator()
+
+    created = 0
+    while True:
+        credit_requests = [CreditRequest(borrower_id=borrower_id, borrower_company_id=company_id, offer_id=offer_id)
+                           for borrower_id, company_id in itertools.islice(borrowers, batch_size)]
+        if not credit_requests:
+            return created
+        created += len(CreditRequest.objects.bulk_create_ignore_conflicts(credit_requests, batch_size))
+
+
+def subtract_interval(interval, covered):
+    """Части целочисленного интервала [start, end], не покрытые интервалом covered"""
+    start, end = interval
+    if start > end:
+        return []
+    if covered is None:
+        return [interval]
+    covered_start, covered_end = covered
+    if covered_start > covered_end or covered_end < start or covered_start > end:
+        return [interval]
+    parts = []
+    if start < covered_start:
+        parts.append((start, covered_start - 1))
+    if covered_end < end:
+        parts.append((covered_end + 1, end))
+    return parts
+
+
+def intersect_interval(interval, bounds):
+    """Часть целочисленного интервала [start, end], лежащая внутри bounds, или None"""
+    start, end = max(interval[0], bounds[0]), min(interval[1], bounds[1])
+    return (start, end) if start <= end else None
+
+
+def offer_rematch_plan(previous, offer, now):
+    """Какие интервалы баллов нужно подобрать сейчас после сохранения предложения.
+
+    previous - значения min_score, max_score, rotation_start и rotation_end до сохранения
+    (None для нового предложения).
+    Неактивное предложение не подбирается: если его ротация еще не началась,
+    весь интервал подберет MatchStartedOffersTask после ее начала. Если ротация уже началась,
+    но задача еще не запускалась, она подберет текущий интервал целиком.
+    """
+    if not offer.rotation_start <= now <= offer.rotation_end:
+        return []
+    interval = (offer.min_score, offer.max_score)
+    if previous and previous['rotation_start'] <= now <= previous['rotation_end']:
+        # Предложение уже было активно, и анкеты из прежнего интервала для него уже подобраны
+        return subtract_interval(interval, (previous['min_score'], previous['max_score']))
+    return subtract_interval(interval, None)
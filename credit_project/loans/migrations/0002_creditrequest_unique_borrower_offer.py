@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 12:39
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0001_initial'),
+    ]
+
+    operations = [
+        # Перед добавлением уникальности удаляем дубли заявок, оставляя самую раннюю
+        migrations.RunSQL(
+            """
+            DELETE FROM loans_creditrequest duplicate
+            USING loans_creditrequest original
+            WHERE duplicate.borrower_id = original.borrower_id
+              AND duplicate.offer_id = original.offer_id
+              AND duplicate.id > original.id
+            """,
+            migrations.RunSQL.noop,
+        ),
+        migrations.AlterUniqueTogether(
+            name='creditrequest',
+            unique_together=set([('borrower', 'offer')]),
+        ),
+    ]
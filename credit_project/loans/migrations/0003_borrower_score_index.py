@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 12:43
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_creditrequest_unique_borrower_offer'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrower',
+            name='score',
+            field=models.PositiveSmallIntegerField(db_index=True, verbose_name='Скоринговый балл'),
+        ),
+    ]
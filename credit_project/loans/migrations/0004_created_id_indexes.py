@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 12:45
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_borrower_score_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrower',
+            index=models.Index(fields=['created', 'id'], name='loans_borro_created_6041f0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditrequest',
+            index=models.Index(fields=['created', 'id'], name='loans_credi_created_b70265_idx'),
+        ),
+    ]
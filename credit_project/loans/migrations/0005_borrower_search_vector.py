@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 12:46
+from __future__ import unicode_literals
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+# ФИО поддерживается в актуальном состоянии триггером, поэтому вектор заполняется
+# и при записи в обход ORM (например, COPY при импорте анкет)
+CREATE_TRIGGER_SQL = '''
+CREATE TRIGGER loans_borrower_search_vector_update
+BEFORE INSERT OR UPDATE OF last_name, first_name, middle_name, search_vector ON loans_borrower
+FOR EACH ROW EXECUTE PROCEDURE
+tsvector_update_trigger(search_vector, 'pg_catalog.simple', last_name, first_name, middle_name);
+'''
+
+DROP_TRIGGER_SQL = 'DROP TRIGGER IF EXISTS loans_borrower_search_vector_update ON loans_borrower;'
+
+BACKFILL_SQL = 'UPDATE loans_borrower SET search_vector = NULL;'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0004_created_id_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrower',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='borrower',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='loans_borro_search__e21e27_gin'),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ]
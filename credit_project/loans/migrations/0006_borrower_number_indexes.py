@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 12:50
+from __future__ import unicode_literals
+
+import credit_project.loans.validators
+from django.db import migrations, models
+import phonenumber_field.modelfields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_borrower_search_vector'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='borrower',
+            name='passport_number',
+            field=models.CharField(db_index=True, max_length=10, validators=[credit_project.loans.validators.validate_passport_number], verbose_name='Номер паспорта'),
+        ),
+        migrations.AlterField(
+            model_name='borrower',
+            name='phone_number',
+            field=phonenumber_field.modelfields.PhoneNumberField(db_index=True, max_length=128, verbose_name='Номер телефона'),
+        ),
+    ]
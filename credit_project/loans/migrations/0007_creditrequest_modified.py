@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 12:52
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_borrower_number_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditrequest',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, verbose_name='Изменена'),
+        ),
+        # Для существующих заявок момент изменения неизвестен, берем момент создания
+        migrations.RunSQL('UPDATE loans_creditrequest SET modified = created;', migrations.RunSQL.noop),
+    ]
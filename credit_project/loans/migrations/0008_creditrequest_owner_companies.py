@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 13:00
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+BACKFILL_SQL = '''
+UPDATE loans_creditrequest AS credit_request
+SET borrower_company_id = borrower.company_id, offer_company_id = offer.company_id
+FROM loans_borrower AS borrower, loans_offer AS offer
+WHERE borrower.id = credit_request.borrower_id AND offer.id = credit_request.offer_id
+  AND credit_request.id >= %s AND credit_request.id < %s
+'''
+
+
+def backfill_owner_companies(apps, schema_editor):
+    """Заполняет компании заявок пачками по id, каждая пачка - отдельная транзакция,
+    чтобы не держать блокировку всей таблицы на время миграции.
+    """
+    CreditRequest = apps.get_model('loans', 'CreditRequest')
+    bounds = CreditRequest.objects.aggregate(min_id=models.Min('id'), max_id=models.Max('id'))
+    if bounds['min_id'] is None:
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for start in range(bounds['min_id'], bounds['max_id'] + 1, BACKFILL_BATCH_SIZE):
+            cursor.execute(BACKFILL_SQL, [start, start + BACKFILL_BATCH_SIZE])
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('loans', '0007_creditrequest_modified'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditrequest',
+            name='borrower_company',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='loans.Company', verbose_name='Компания анкеты'),
+        ),
+        migrations.AddField(
+            model_name='creditrequest',
+            name='offer_company',
+            field=models.ForeignKey(db_index=False, editable=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='loans.Company', verbose_name='Компания предложения'),
+        ),
+        migrations.RunPython(backfill_owner_companies, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='creditrequest',
+            name='borrower_company',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='loans.Company', verbose_name='Компания анкеты'),
+        ),
+        migrations.AlterField(
+            model_name='creditrequest',
+            name='offer_company',
+            field=models.ForeignKey(db_index=False, editable=False, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='loans.Company', verbose_name='Компания предложения'),
+        ),
+        migrations.AddIndex(
+            model_name='creditrequest',
+            index=models.Index(fields=['borrower_company', 'status', 'created'], name='loans_credi_borrowe_ad44e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='creditrequest',
+            index=models.Index(fields=['offer_company', 'status', 'created'], name='loans_credi_offer_c_4df9e8_idx'),
+        ),
+    ]
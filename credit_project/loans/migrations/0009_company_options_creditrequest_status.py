@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.11.15 on 2026-10-18 15:10
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0008_creditrequest_owner_companies'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='company',
+            options={'ordering': ('name',), 'verbose_name': 'Компания', 'verbose_name_plural': 'Компании'},
+        ),
+        migrations.AlterField(
+            model_name='creditrequest',
+            name='status',
+            field=models.CharField(choices=[('new', 'Новая'), ('sent', 'Отправлена'), ('received', 'Получена'), ('approved', 'Одобрено'), ('denied', 'Отказано'), ('issued', 'Выдано')], default='new', max_length=20, verbose_name='Статус'),
+        ),
+    ]
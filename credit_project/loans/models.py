@@ -1,11 +1,13 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 from model_utils.choices import Choices
 from phonenumber_field.modelfields import PhoneNumberField
 
-from .managers import OfferManager
+from .managers import CreditRequestManager, OfferManager
 from .validators import validate_passport_number
 
 User = get_user_model()
@@ -74,17 +76,24 @@ class Borrower(models.Model):
     first_name = models.CharField(_('Имя'), max_length=255)
     middle_name = models.CharField(_('Отчество'), max_length=255)
     birth_date = models.DateField(_('Дата рождения'))
-    phone_number = PhoneNumberField(_('Номер телефона'))
-    passport_number = models.CharField(_('Номер паспорта'), max_length=10,
+    phone_number = PhoneNumberField(_('Номер телефона'), db_index=True)
+    passport_number = models.CharField(_('Номер паспорта'), max_length=10, db_index=True,
                                        validators=[validate_passport_number, ])
 
-    score = models.PositiveSmallIntegerField(_('Скоринговый балл'))
+    score = models.PositiveSmallIntegerField(_('Скоринговый балл'), db_index=True)
     company = models.ForeignKey(Company, verbose_name=_('Партнер'), on_delete=models.PROTECT)
 
+    # ФИО для полнотекстового поиска, заполняется триггером в БД (см. миграцию 0005)
+    search_vector = SearchVectorField(null=True, editable=False)
+
     class Meta:
         verbose_name = _('Анкета клиента')
         verbose_name_plural = _('Анкеты клиентов')
         ordering = ('-created', )
+        indexes = [
+            models.Index(fields=['created', 'id']),
+            GinIndex(fields=['search_vector']),
+        ]
 
     def __str__(self):
         return '{} {} {}'.format(self.last_name, self.first_name, self.middle_name)
@@ -99,18 +108,59 @@ class CreditRequest(models.Model):
         ('denied', _('Отказано')),
         ('issued', _('Выдано'))
     )
+    # Допустимые переходы: статус -> статусы, из которых в него можно перевести заявку
+    STATUS_TRANSITIONS = {
+        STATUSES.sent: (STATUSES.new, ),
+        STATUSES.received: (STATUSES.sent, ),
+        STATUSES.approved: (STATUSES.received, ),
+        STATUSES.denied: (STATUSES.received, ),
+        STATUSES.issued: (STATUSES.approved, ),
+    }
     status = models.CharField(_('Статус'), choices=STATUSES, default=STATUSES.new, max_length=20)
     created = models.DateTimeField(_('Создана'), auto_now_add=True)
+    modified = models.DateTimeField(_('Изменена'), auto_now=True)
     sent_date = models.DateTimeField(_('Отправлена'), blank=True, null=True)
     borrower = models.ForeignKey(Borrower, verbose_name=_('Анкета клиента'),
                                  on_delete=models.PROTECT)
     offer = models.ForeignKey(Offer, verbose_name=_('Предложение'),
                               on_delete=models.PROTECT)
 
+    # Компании анкеты и предложения, продублированные для выборок по ролям без join
+    borrower_company = models.ForeignKey(Company, verbose_name=_('Компания анкеты'), related_name='+',
+                                         on_delete=models.PROTECT, editable=False, db_index=False)
+    offer_company = models.ForeignKey(Company, verbose_name=_('Компания предложения'), related_name='+',
+                                      on_delete=models.PROTECT, editable=False, db_index=False)
+
+    objects = CreditRequestManager()
+
     class Meta:
         verbose_name = _('Заявка в КО')
         verbose_name_plural = _('Заявки в КО')
         ordering = ('-created', )
+        unique_together = ('borrower', 'offer')
+        indexes = [
+            models.Index(fields=['created', 'id']),
+            models.Index(fields=['borrower_company', 'status', 'created']),
+            models.Index(fields=['offer_company', 'status', 'created']),
+        ]
 
     def __str__(self):
         return 'CreditRequest: {} / {}'.format(self.id, self.status)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Анкета и предложение на момент загрузки: компании обновляются, только если они изменились
+        instance._loaded_owner_ids = (instance.__dict__.get('borrower_id'), instance.__dict__.get('offer_id'))
+        return instance
+
+    def save(self, *args, **kwargs):
+        # Анкета и предложение загружаются, только если компании не заполнены или сменились,
+        # поэтому, например, смена статуса не делает лишних запросов
+        loaded_borrower_id, loaded_offer_id = getattr(self, '_loaded_owner_ids', (None, None))
+        if self.borrower_company_id is None or self.borrower_id != loaded_borrower_id:
+            self.borrower_company_id = self.borrower.company_id
+        if self.offer_company_id is None or self.offer_id != loaded_offer_id:
+            self.offer_company_id = self.offer.company_id
+        super().save(*args, **kwargs)
+        self._loaded_owner_ids = (self.borrower_id, self.offer_id)
@@ -0,0 +1,171 @@
+import bisect
+import datetime
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import Offer
+
+
+class ActiveOfferIndex:
+    """Индекс активных предложений по интервалам скоринговых баллов.
+
+    Живет в памяти процесса (воркера) и отвечает на вопрос "какие предложения подходят
+    под балл S" без запроса к БД. Индекс перестраивается, когда:
+    - наступает ближайшая граница ротации (rotation_start / rotation_end) любого предложения;
+    - меняется версия в общем кэше (предложение сохранено или удалено в любом процессе).
+
+    Данные индекса тоже хранятся в общем кэше под ключом с версией, поэтому процесс
+    не может взять данные одной версии вместе с другой версией. Из БД их строит только
+    процесс, занявший блокировку (cache.add), остальные ждут результата.
+    """
+    VERSION_CACHE_KEY = 'loans:active_offer_index:version'
+    DATA_CACHE_KEY = 'loans:active_offer_index:data:{}'
+    REBUILD_LOCK_CACHE_KEY = 'loans:active_offer_index:rebuild:{}'
+    DATA_TIMEOUT = 24 * 60 * 60
+    REBUILD_LOCK_TIMEOUT = 30
+    # Сколько ждать чужой перестройки, прежде чем построить индекс самому
+    REBUILD_WAIT = 5
+    REBUILD_POLL_INTERVAL = 0.05
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._expires_at = None
+        self._min_scores = []
+        self._offers = []
+        self._max_scores = []
+        self._offers_by_max = []
+        self._company_ids = {}
+
+    def offers_for_score(self, score, now=None):
+        """Список id активных предложений, у которых min_score <= score <= max_score"""
+        self._ensure_fresh(now or timezone.now())
+        position = bisect.bisect_right(self._min_scores, score)
+        return [offer_id for min_score, max_score, offer_id in self._offers[:position]
+                if max_score >= score]
+
+    def newly_eligible_offers(self, previous_score, score, now=None):
+        """Список id активных предложений, которые подходят под score, но не подходили под previous_score.
+
+        Просматриваются только предложения, у которых между двумя баллами лежит
+        min_score (балл вырос) или max_score (балл уменьшился).
+        """
+        self._ensure_fresh(now or timezone.now())
+        if score > previous_score:
+            start = bisect.bisect_right(self._min_scores, previous_score)
+            end = bisect.bisect_right(self._min_scores, score)
+            return [offer_id for _, max_score, offer_id in self._offers[start:end] if max_score >= score]
+        if score < previous_score:
+            start = bisect.bisect_left(self._max_scores, score)
+            end = bisect.bisect_left(self._max_scores, previous_score)
+            return [offer_id for _, min_score, offer_id in self._offers_by_max[start:end] if min_score <= score]
+        return []
+
+    def company_ids(self, now=None):
+        """Словарь {id активного предложения: id его компании}"""
+        self._ensure_fresh(now or timezone.now())
+        return self._company_ids
+
+    def state(self, now=None):
+        """Пара (версия, момент устаревания) актуального индекса.
+
+        Данные, вычисленные из активных предложений, остаются верными, пока не сменилась
+        версия и не наступил момент устаревания (None - ближайших границ ротации нет).
+        """
+        self._ensure_fresh(now or timezone.now())
+        return self._version, self._expires_at
+
+    def invalidate(self):
+        """Сбрасывает индекс во всех процессах после коммита текущей транзакции"""
+        transaction.on_commit(self._invalidate)
+
+    def _invalidate(self):
+        cache.set(self.VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+        with self._lock:
+            self._version = None
+
+    def _get_version(self):
+        version = cache.get(self.VERSION_CACHE_KEY)
+        if version is None:
+            cache.add(self.VERSION_CACHE_KEY, uuid.uuid4().hex, None)
+            version = cache.get(self.VERSION_CACHE_KEY)
+        return version
+
+    def _ensure_fresh(self, now):
+        version = self._get_version()
+        if self._is_fresh(version, now):
+            return
+        with self._lock:
+            # Пока поток ждал блокировку, индекс мог перестроить другой поток
+            if not self._is_fresh(version, now):
+                self._apply(self._load(now, version), version)
+
+    def _is_fresh(self, version, now):
+        return (self._version is not None and self._version == version and
+                (self._expires_at is None or now < self._expires_at))
+
+    def _load(self, now, version):
+        """Данные индекса версии version из общего кэша. Если их нет или они устарели,
+        строит их по БД процесс, занявший блокировку; если за REBUILD_WAIT секунд данные
+        так и не появились (например, строивший процесс упал), процесс строит их сам.
+        """
+        data_key = self.DATA_CACHE_KEY.format(version)
+        lock_key = self.REBUILD_LOCK_CACHE_KEY.format(version)
+        deadline = time.monotonic() + self.REBUILD_WAIT
+        while True:
+            data = cache.get(data_key)
+            if data is not None and data['built_at'] <= now and (
+                    data['expires_at'] is None or now < data['expires_at']):
+                return data
+            if cache.add(lock_key, True, self.REBUILD_LOCK_TIMEOUT):
+                try:
+                    data = self._build(now)
+                    cache.set(data_key, data, self.DATA_TIMEOUT)
+                finally:
+                    cache.delete(lock_key)
+                return data
+            if time.monotonic() >= deadline:
+                return self._build(now)
+            time.sleep(self.REBUILD_POLL_INTERVAL)
+
+    def _build(self, now):
+        """Данные индекса по БД: активные предложения на момент now и момент устаревания.
+        Они верны с момента now до ближайшей границы ротации.
+        """
+        offers = sorted(Offer.objects.active(now).values_list(
+            'min_score', 'max_score', 'id', 'rotation_end', 'company_id'))
+
+        # Предложение активно включительно по rotation_end,
+        # поэтому индекс устаревает сразу после этого момента
+        boundaries = [rotation_end + datetime.timedelta(microseconds=1)
+                      for _, _, _, rotation_end, _ in offers]
+        next_start = Offer.objects.filter(rotation_start__gt=now).aggregate(
+            next_start=Min('rotation_start'))['next_start']
+        if next_start:
+            boundaries.append(next_start)
+
+        return {
+            'offers': [(min_score, max_score, offer_id, company_id)
+                       for min_score, max_score, offer_id, _, company_id in offers],
+            'built_at': now,
+            'expires_at': min(boundaries) if boundaries else None,
+        }
+
+    def _apply(self, data, version):
+        self._offers = [(min_score, max_score, offer_id) for min_score, max_score, offer_id, _ in data['offers']]
+        self._company_ids = {offer_id: company_id for _, _, offer_id, company_id in data['offers']}
+        self._min_scores = [min_score for min_score, _, _ in self._offers]
+        self._offers_by_max = sorted((max_score, min_score, offer_id)
+                                     for min_score, max_score, offer_id in self._offers)
+        self._max_scores = [max_score for max_score, _, _ in self._offers_by_max]
+        self._expires_at = data['expires_at']
+        self._version = version
+
+
+offer_index = ActiveOfferIndex()
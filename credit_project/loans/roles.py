@@ -0,0 +1,60 @@
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+
+from .models import Company
+
+
+class UserRole(namedtuple('UserRole', ('is_superuser', 'company_id', 'company_kind'))):
+    """Роль пользователя: суперпользователь и/или сотрудник компании определенного типа"""
+    __slots__ = ()
+
+    @property
+    def has_company(self):
+        return self.company_id is not None
+
+    @property
+    def is_partner(self):
+        return self.company_kind == Company.KIND.partner
+
+    @property
+    def is_credit_organization(self):
+        return self.company_kind == Company.KIND.credit_organization
+
+
+ROLE_CACHE_KEY = 'loans:user_role:{}'
+
+# Роль пользователя изменилась: для сброса других кэшей, в которых она хранится
+user_role_invalidated = Signal(providing_args=['user_id'])
+
+
+def get_user_role(user):
+    """Роль пользователя без запроса к БД на каждую проверку.
+
+    Компания пользователя берется из общего кэша (сбрасывается при изменении компании),
+    а вычисленная роль запоминается на объекте пользователя, то есть на время запроса.
+    """
+    role = getattr(user, '_role', None)
+    if role is not None:
+        return role
+
+    company = (None, None)
+    if user.is_authenticated:
+        key = ROLE_CACHE_KEY.format(user.pk)
+        company = cache.get(key)
+        if company is None:
+            company = Company.objects.filter(user_id=user.pk).values_list('id', 'kind').first() or (None, None)
+            cache.set(key, company, settings.USER_ROLE_CACHE_TIMEOUT)
+
+    role = UserRole(user.is_superuser, *company)
+    user._role = role
+    return role
+
+
+def invalidate_user_role(user_id):
+    """Сбрасывает закэшированную роль пользователя после коммита текущей транзакции"""
+    transaction.on_commit(lambda: cache.delete(ROLE_CACHE_KEY.format(user_id)))
+    user_role_invalidated.send(sender=UserRole, user_id=user_id)
@@ -0,0 +1,76 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from credit_project.taskapp.dispatch import enqueue
+
+from .matching import offer_rematch_plan
+from .models import Borrower, Company, CreditRequest, Offer
+from .offer_index import offer_index
+from .roles import invalidate_user_role
+from .tasks import RematchOfferTask
+
+
+@receiver(post_save, sender=Offer)
+@receiver(post_delete, sender=Offer)
+def invalidate_offer_index(sender, **kwargs):
+    offer_index.invalidate()
+
+
+@receiver(pre_save, sender=Company)
+def remember_company_user(sender, instance, **kwargs):
+    instance._previous_user_id = None
+    if instance.pk:
+        instance._previous_user_id = Company.objects.filter(pk=instance.pk).values_list(
+            'user_id', flat=True).first()
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_user_role(sender, instance, **kwargs):
+    invalidate_user_role(instance.user_id)
+    previous_user_id = getattr(instance, '_previous_user_id', None)
+    if previous_user_id and previous_user_id != instance.user_id:
+        invalidate_user_role(previous_user_id)
+
+
+@receiver(pre_save, sender=Offer)
+def remember_offer_matching_fields(sender, instance, **kwargs):
+    instance._previous_matching_fields = None
+    if instance.pk:
+        instance._previous_matching_fields = Offer.objects.filter(pk=instance.pk).values(
+            'min_score', 'max_score', 'rotation_start', 'rotation_end', 'company_id').first()
+
+
+@receiver(post_save, sender=Offer)
+def rematch_offer(sender, instance, raw, **kwargs):
+    """Подбирает анкеты только из интервалов баллов, которые предложение стало покрывать"""
+    if raw:
+        return
+    intervals = offer_rematch_plan(instance._previous_matching_fields, instance, timezone.now())
+    if intervals:
+        enqueue(RematchOfferTask(), kwargs={'offer_id': instance.id, 'intervals': intervals})
+
+
+@receiver(pre_save, sender=Borrower)
+def remember_borrower_company(sender, instance, **kwargs):
+    instance._previous_company_id = None
+    if instance.pk:
+        instance._previous_company_id = Borrower.objects.filter(pk=instance.pk).values_list(
+            'company_id', flat=True).first()
+
+
+@receiver(post_save, sender=Borrower)
+def update_credit_requests_borrower_company(sender, instance, raw, **kwargs):
+    """Компания анкеты продублирована в заявках"""
+    previous_company_id = getattr(instance, '_previous_company_id', None)
+    if not raw and previous_company_id and previous_company_id != instance.company_id:
+        CreditRequest.objects.filter(borrower_id=instance.id).update(borrower_company_id=instance.company_id)
+
+
+@receiver(post_save, sender=Offer)
+def update_credit_requests_offer_company(sender, instance, raw, **kwargs):
+    """Компания предложения продублирована в заявках"""
+    previous = getattr(instance, '_previous_matching_fields', None)
+    if not raw and previous and previous['company_id'] != instance.company_id:
+        CreditRequest.objects.filter(offer_id=instance.id).update(offer_company_id=instance.company_id)
@@ -1,6 +1,16 @@
+import datetime
+
 from celery import Task
+from celery_batches import Batches
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
 
+from credit_project.loans.jobs import FAILURE, fail_job, finish_job
+from credit_project.loans.matching import create_credit_requests_for_score_intervals, intersect_interval
 from credit_project.loans.models import CreditRequest, Borrower, Offer
+from credit_project.loans.offer_index import offer_index
 from credit_project.taskapp.celery import app
 
 import logging
@@ -8,14 +18,31 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# Время последнего запуска MatchStartedOffersTask
+ROTATION_SWEEP_CACHE_KEY = 'loans:rotation_sweep'
+
 
 class CreateOfferRequestsTask(Task):
     name = 'credit_project.loans.tasks.CreateOfferRequestsTask'
 
-    def run(self, borrower_id, offer_id=None):
+    def run(self, borrower_id, offer_id=None, offer_ids=None, job_id=None):
+        """job_id - id задания (см. loans.jobs), в которое записывается результат"""
         borrower = self.get_borrower(borrower_id)
-        offers = self.get_offers(borrower, offer_id)
-        self.create_credit_requests(borrower, offers)
+        if borrower is None:
+            if job_id:
+                finish_job(job_id, [], state=FAILURE)
+            return
+        offer_ids = self.get_offer_ids(borrower, offer_id, offer_ids)
+        created_ids = self.create_credit_requests(borrower, offer_ids)
+        if job_id:
+            finish_job(job_id, created_ids)
+        return len(created_ids)
+
+    def on_failure(self, exc, task_id, args, kwargs, einfo):
+        """Задание упавшей задачи не должно навсегда остаться в состоянии pending"""
+        job_id = dict(zip(('borrower_id', 'offer_id', 'offer_ids', 'job_id'), args), **kwargs).get('job_id')
+        if job_id:
+            fail_job(job_id)
 
     def get_borrower(self, borrower_id):
         try:
@@ -25,25 +52,219 @@ class CreateOfferRequestsTask(Task):
         else:
             return borrower
 
-    def get_offers(self, borrower, offer_id=None):
+    def get_offer_ids(self, borrower, offer_id=None, offer_ids=None):
         """Если не указано предложение, значит создаем по заявке на кредит
-        для всех подходящих предложений
+        для всех подходящих предложений.
+        Подходящие предложения берем из индекса активных предложений воркера, без запроса к БД.
+        offer_ids - предложения, которые стали подходить анкете (например, после изменения балла).
+        """
+        requested_offer_ids = [offer_id, ] if offer_id else offer_ids
+        if requested_offer_ids is None:
+            return offer_index.offers_for_score(borrower.score)
+
+        existing_offer_ids = set(Offer.objects.filter(id__in=requested_offer_ids).values_list('id', flat=True))
+        for missing_offer_id in set(requested_offer_ids) - existing_offer_ids:
+            logger.error('CreateOfferRequestsTask: Предложение {} не найдено.'.format(missing_offer_id))
+        return [requested_offer_id for requested_offer_id in requested_offer_ids
+                if requested_offer_id in existing_offer_ids]
+
+    def create_credit_requests(self, borrower, offer_ids):
+        """Создает заявки одним запросом. Уже существующие заявки по паре анкета/предложение
+        пропускаются, поэтому повторная доставка задачи не создает дублей.
+        Возвращает список id созданных заявок.
         """
-        offers = None
-        if offer_id:
-            try:
-                offer = Offer.objects.get(id=offer_id)
-            except Offer.DoesNotExist:
-                logger.error('CreateOfferRequestsTask: Предложение {} не найдено.'.format(offer_id))
+        offer_company_ids = offer_index.company_ids()
+        created_ids = CreditRequest.objects.bulk_create_ignore_conflicts(
+            [CreditRequest(borrower=borrower, borrower_company_id=borrower.company_id,
+                           offer_id=offer_id, offer_company_id=offer_company_ids.get(offer_id))
+             for offer_id in offer_ids])
+        logger.info('CreateOfferRequestsTask: По анкете {} создано заявок: {}.'.format(
+            borrower.id, len(created_ids)))
+        return created_ids
+
+
+class CreateOfferRequestsBatchTask(Batches):
+    """Пакетный режим CreateOfferRequestsTask.
+
+    Воркер копит сообщения CreateOfferRequestsTask (те же аргументы borrower_id, offer_id, offer_ids)
+    и обрабатывает их пачкой: до CREDIT_REQUESTS_BATCH_SIZE сообщений или
+    не дольше CREDIT_REQUESTS_BATCH_INTERVAL_MS. Анкеты загружаются одним запросом,
+    подбор предложений идет по индексу в памяти, все заявки пишутся в одной транзакции.
+
+    Включается на воркере настройкой CREDIT_REQUESTS_BATCH_CONSUMER: задача регистрируется
+    под именем CreateOfferRequestsTask, поэтому отправителей менять не нужно.
+    """
+    name = CreateOfferRequestsTask.name
+    flush_every = settings.CREDIT_REQUESTS_BATCH_SIZE
+    flush_interval = settings.CREDIT_REQUESTS_BATCH_INTERVAL_MS / 1000
+
+    def run(self, requests):
+        messages = [self.get_message_kwargs(request) for request in requests]
+        try:
+            return self.create_credit_requests(messages)
+        except Exception:
+            # Задания сообщений упавшей пачки не должны навсегда остаться в состоянии pending
+            for kwargs in messages:
+                if kwargs.get('job_id'):
+                    fail_job(kwargs['job_id'])
+            raise
+
+    def create_credit_requests(self, messages):
+        borrowers = self.get_borrowers({kwargs['borrower_id'] for kwargs in messages})
+        offer_company_ids = dict(offer_index.company_ids())
+        offer_company_ids.update(self.get_offer_company_ids(
+            {offer_id for kwargs in messages for offer_id in kwargs['offer_ids'] or ()}))
+
+        credit_requests = []
+        for kwargs in messages:
+            borrower_id = kwargs['borrower_id']
+            kwargs['matched_offer_ids'] = []
+            if borrower_id not in borrowers:
+                logger.error('CreateOfferRequestsBatchTask: Анкета {} не найдена.'.format(borrower_id))
+                if kwargs.get('job_id'):
+                    finish_job(kwargs['job_id'], [], state=FAILURE)
+                continue
+            score, borrower_company_id = borrowers[borrower_id]
+            if kwargs['offer_ids'] is None:
+                matched_offer_ids = offer_index.offers_for_score(score)
             else:
-                offers = [offer, ]
-        else:
-            offers = Offer.objects.active()
-            offers = offers.filter(min_score__lte=borrower.score, max_score__gte=borrower.score)
-        return offers
+                matched_offer_ids = []
+                for offer_id in kwargs['offer_ids']:
+                    if offer_id in offer_company_ids:
+                        matched_offer_ids.append(offer_id)
+                    else:
+                        logger.error('CreateOfferRequestsBatchTask: Предложение {} не найдено.'.format(offer_id))
+            kwargs['matched_offer_ids'] = matched_offer_ids
+            # offers_for_score может перестроить индекс, и нового предложения в снимке компаний не будет:
+            # такие компании догрузит bulk_create_ignore_conflicts
+            credit_requests.extend(CreditRequest(borrower_id=borrower_id, borrower_company_id=borrower_company_id,
+                                                 offer_id=matched_offer_id,
+                                                 offer_company_id=offer_company_ids.get(matched_offer_id))
+                                   for matched_offer_id in matched_offer_ids)
+
+        with transaction.atomic():
+            created_ids = CreditRequest.objects.bulk_create_ignore_conflicts(credit_requests)
+        self.finish_jobs([kwargs for kwargs in messages
+                          if kwargs.get('job_id') and kwargs['borrower_id'] in borrowers], created_ids)
+        logger.info('CreateOfferRequestsBatchTask: Обработано сообщений: {}, создано заявок: {}.'.format(
+            len(messages), len(created_ids)))
+        return len(created_ids)
+
+    def get_message_kwargs(self, request):
+        """Аргументы сообщения в том виде, в каком их принимает CreateOfferRequestsTask.run.
+        offer_id приводится к списку offer_ids.
+        """
+        kwargs = dict(zip(('borrower_id', 'offer_id', 'offer_ids', 'job_id'), request.args))
+        kwargs.update(request.kwargs)
+        offer_id = kwargs.get('offer_id')
+        kwargs['offer_ids'] = [offer_id, ] if offer_id else kwargs.get('offer_ids')
+        return kwargs
+
+    def finish_jobs(self, messages, created_ids):
+        """Записывает результат в задания сообщений: созданные заявки по анкете и предложениям сообщения"""
+        if not messages:
+            return
+        created_pairs = {}
+        if created_ids:
+            created = CreditRequest.objects.filter(id__in=created_ids).values_list('id', 'borrower_id', 'offer_id')
+            created_pairs = {(borrower_id, offer_id): credit_request_id
+                             for credit_request_id, borrower_id, offer_id in created}
+        for kwargs in messages:
+            pairs = ((kwargs['borrower_id'], offer_id) for offer_id in kwargs['matched_offer_ids'])
+            finish_job(kwargs['job_id'], [created_pairs[pair] for pair in pairs if pair in created_pairs])
+
+    def get_borrowers(self, borrower_ids):
+        """Словарь {id анкеты: (балл, id компании)}"""
+        return {borrower_id: (score, company_id) for borrower_id, score, company_id in
+                Borrower.objects.filter(id__in=borrower_ids).values_list('id', 'score', 'company_id')}
+
+    def get_offer_company_ids(self, offer_ids):
+        """Словарь {id предложения: id компании} для существующих предложений из offer_ids"""
+        if not offer_ids:
+            return {}
+        return dict(Offer.objects.filter(id__in=offer_ids).values_list('id', 'company_id'))
+
+
+class CreateBorrowersOfferRequestsTask(Task):
+    """Создает заявки по всем подходящим предложениям для пачки анкет (например, после импорта).
+
+    Одно сообщение на всю пачку: анкеты загружаются одним запросом,
+    предложения подбираются по индексу активных предложений.
+    """
+    name = 'credit_project.loans.tasks.CreateBorrowersOfferRequestsTask'
+
+    def run(self, borrower_ids):
+        offer_company_ids = offer_index.company_ids()
+        credit_requests = []
+        borrowers = Borrower.objects.filter(id__in=borrower_ids).values_list('id', 'score', 'company_id')
+        for borrower_id, score, company_id in borrowers:
+            # Предложения, которых нет в снимке компаний (индекс перестроен при подборе),
+            # получат компанию в bulk_create_ignore_conflicts
+            credit_requests.extend(CreditRequest(borrower_id=borrower_id, borrower_company_id=company_id,
+                                                 offer_id=offer_id, offer_company_id=offer_company_ids.get(offer_id))
+                                   for offer_id in offer_index.offers_for_score(score))
+        created_ids = CreditRequest.objects.bulk_create_ignore_conflicts(credit_requests)
+        logger.info('CreateBorrowersOfferRequestsTask: Анкет: {}, создано заявок: {}.'.format(
+            len(borrower_ids), len(created_ids)))
+        return len(created_ids)
+
+
+class RematchOfferTask(Task):
+    """Создает заявки по предложению для анкет из новых интервалов баллов.
+
+    Если до выполнения задачи предложение снова сохранили, интервалы обрезаются
+    по текущим границам баллов: следующее сохранение сравнивается уже с новыми границами
+    и эти интервалы повторно не планирует, поэтому пропускать их нельзя.
+    modified - аргумент сообщений, поставленных до этого изменения, не используется.
+    """
+    name = 'credit_project.loans.tasks.RematchOfferTask'
+
+    def run(self, offer_id, intervals, modified=None):
+        try:
+            offer = Offer.objects.active().get(id=offer_id)
+        except Offer.DoesNotExist:
+            logger.info('RematchOfferTask: Активное предложение {} не найдено.'.format(offer_id))
+            return 0
+
+        intervals = [interval for interval in (
+            intersect_interval(interval, (offer.min_score, offer.max_score)) for interval in intervals) if interval]
+        created = create_credit_requests_for_score_intervals(offer.id, intervals)
+        logger.info('RematchOfferTask: По предложению {} создано заявок: {}.'.format(offer_id, created))
+        return created
+
+
+class MatchStartedOffersTask(Task):
+    """Периодическая задача (CELERY_BEAT_SCHEDULE): подбирает анкеты по предложениям,
+    ротация которых началась с прошлого запуска.
+
+    Предложения, сохраненные до начала ротации, при сохранении не подбирались, а при сохранении
+    после начала ротации прежний интервал считается уже подобранным этой задачей.
+    Задача с eta на начало ротации для этого не подходит: брокер Redis заново доставляет
+    сообщения, не подтвержденные за visibility_timeout, а до начала ротации могут быть месяцы.
+    """
+    name = 'credit_project.loans.tasks.MatchStartedOffersTask'
+
+    def run(self):
+        now = timezone.now()
+        since = cache.get(ROTATION_SWEEP_CACHE_KEY) or now - datetime.timedelta(
+            seconds=settings.OFFER_ROTATION_SWEEP_LOOKBACK)
+        # Предложения, сохраненные после начала ротации, тоже подбираются: при сохранении
+        # прежний интервал считался уже подобранным. Существующие заявки пропускаются
+        offers = Offer.objects.active(now).filter(rotation_start__gt=since).values_list('id', 'min_score', 'max_score')
+
+        created = 0
+        for offer_id, min_score, max_score in offers:
+            created += create_credit_requests_for_score_intervals(offer_id, [(min_score, max_score)])
+        cache.set(ROTATION_SWEEP_CACHE_KEY, now, None)
+        logger.info('MatchStartedOffersTask: Предложений: {}, создано заявок: {}.'.format(len(offers), created))
+        return created
+
 
-    def create_credit_requests(self, borrower, offers):
-        for offer in offers:
-            CreditRequest.objects.create(borrower=borrower, offer=offer)
+app.tasks.register(RematchOfferTask)
+app.tasks.register(MatchStartedOffersTask)
+app.tasks.register(CreateBorrowersOfferRequestsTask)
 
-app.tasks.register(CreateOfferRequestsTask)
+if settings.CREDIT_REQUESTS_BATCH_CONSUMER:
+    app.tasks.register(CreateOfferRequestsBatchTask)
+else:
+    app.tasks.register(CreateOfferRequestsTask)
@@ -0,0 +1,66 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TransactionTestCase
+
+from credit_project.loans.tasks import CreateBorrowersOfferRequestsTask, CreateOfferRequestsTask
+from credit_project.taskapp.dispatch import enqueue
+
+
+class Rollback(Exception):
+    pass
+
+
+@mock.patch('credit_project.loans.tasks.CreateBorrowersOfferRequestsTask.apply_async')
+@mock.patch('credit_project.loans.tasks.CreateOfferRequestsTask.apply_async')
+class EnqueueTestCase(TransactionTestCase):
+
+    def test_commit(self, apply_async_mock, borrowers_apply_async_mock):
+        """Сообщения транзакции отправляются после коммита через общее соединение из пула"""
+        with transaction.atomic():
+            enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 1})
+            enqueue(CreateBorrowersOfferRequestsTask(), kwargs={'borrower_ids': [2]}, countdown=5)
+            apply_async_mock.assert_not_called()
+            borrowers_apply_async_mock.assert_not_called()
+
+        apply_async_mock.assert_called_once_with(None, {'borrower_id': 1}, producer=mock.ANY)
+        borrowers_apply_async_mock.assert_called_once_with(None, {'borrower_ids': [2]}, producer=mock.ANY,
+                                                           countdown=5)
+        self.assertIs(apply_async_mock.call_args[1]['producer'], borrowers_apply_async_mock.call_args[1]['producer'])
+
+        # Сообщения следующей транзакции ждут уже ее коммита
+        apply_async_mock.reset_mock()
+        with transaction.atomic():
+            enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 3})
+        apply_async_mock.assert_called_once_with(None, {'borrower_id': 3}, producer=mock.ANY)
+
+    def test_rollback(self, apply_async_mock, borrowers_apply_async_mock):
+        with self.assertRaises(Rollback), transaction.atomic():
+            enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 1})
+            raise Rollback
+        apply_async_mock.assert_not_called()
+
+        # Откат savepoint отбрасывает только его сообщения
+        with transaction.atomic():
+            enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 2})
+            with self.assertRaises(Rollback), transaction.atomic():
+                enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 3})
+                raise Rollback
+            with transaction.atomic():
+                enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 4})
+        self.assertEqual([call[0][1] for call in apply_async_mock.call_args_list],
+                         [{'borrower_id': 2}, {'borrower_id': 4}])
+
+    def test_without_transaction(self, apply_async_mock, borrowers_apply_async_mock):
+        enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 1})
+        apply_async_mock.assert_called_once_with(None, {'borrower_id': 1}, producer=mock.ANY)
+
+    def test_publish_error(self, apply_async_mock, borrowers_apply_async_mock):
+        """Ошибка отправки не мешает остальным сообщениям транзакции и вызывает on_error"""
+        apply_async_mock.side_effect = ConnectionError
+        on_error = mock.Mock()
+        with transaction.atomic():
+            enqueue(CreateOfferRequestsTask(), kwargs={'borrower_id': 1}, on_error=on_error)
+            enqueue(CreateBorrowersOfferRequestsTask(), kwargs={'borrower_ids': [2]})
+        on_error.assert_called_once_with()
+        borrowers_apply_async_mock.assert_called_once_with(None, {'borrower_ids': [2]}, producer=mock.ANY)
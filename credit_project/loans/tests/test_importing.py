@@ -0,0 +1,50 @@
+import io
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from credit_project.api.tests.factories import CompanyFactory
+from credit_project.loans.importing import BorrowerImporter, read_rows
+from credit_project.loans.models import Borrower, Company
+
+CSV_HEADER = 'last_name,first_name,middle_name,birth_date,phone_number,passport_number,score\n'
+
+
+class BorrowerImporterTestCase(TestCase):
+
+    def setUp(self):
+        self.company = CompanyFactory(kind=Company.KIND.partner)
+
+    def test_batches(self):
+        content = CSV_HEADER + ''.join(
+            'Фамилия,Имя,Отчество,1980-01-01,+7999000000{0},000000000{0},{0}\n'.format(i) for i in range(5))
+        rows = read_rows(io.BytesIO(content.encode('utf-8')), 'csv')
+
+        report = BorrowerImporter(self.company.id, batch_size=2).run(rows)
+
+        self.assertEqual(report.created, 5)
+        self.assertEqual(report.errors, [])
+        self.assertEqual(
+            list(Borrower.objects.filter(id__in=report.created_ids).order_by('id').values_list('score', flat=True)),
+            [0, 1, 2, 3, 4])
+
+    def test_command(self):
+        content = CSV_HEADER + 'Фамилия,Имя,Отчество,1980-01-01,+79990000000,0000000000,1\n' \
+                               ',Имя,Отчество,1980-01-01,+79990000000,0000000000,1\n'
+        with tempfile.NamedTemporaryFile(suffix='.csv', delete=False) as fileobj:
+            fileobj.write(content.encode('utf-8'))
+        self.addCleanup(os.remove, fileobj.name)
+
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch('credit_project.loans.management.commands.import_borrowers.enqueue') as enqueue_mock:
+            call_command('import_borrowers', fileobj.name, '--company={}'.format(self.company.id), match=True,
+                         stdout=stdout, stderr=stderr)
+
+        borrower = Borrower.objects.get()
+        self.assertEqual(borrower.company, self.company)
+        self.assertIn('Строка 2', stderr.getvalue())
+        self.assertIn('Создано анкет: 1, строк с ошибками: 1', stdout.getvalue())
+        enqueue_mock.assert_called_once_with(mock.ANY, kwargs={'borrower_ids': [borrower.id]})
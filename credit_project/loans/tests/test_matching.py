@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from credit_project.api.tests.factories import BorrowerFactory, OfferFactory
+from credit_project.api.tests.utils import get_tz_datetime
+from credit_project.loans.matching import (
+    BorrowerScores,
+    create_credit_requests_for_offers,
+    create_credit_requests_for_score_intervals,
+    intersect_interval,
+    offer_rematch_plan,
+    subtract_interval,
+)
+from credit_project.loans.models import CreditRequest
+
+
+class BorrowerScoresTestCase(TestCase):
+
+    def setUp(self):
+        self.borrowers = {score: BorrowerFactory(score=score) for score in (50, 100, 300, 500, 501)}
+        self.offer = OfferFactory(min_score=100, max_score=500,
+                                  rotation_start=get_tz_datetime(1990, 1, 1),
+                                  rotation_end=get_tz_datetime(2100, 1, 1))
+        self.offer2 = OfferFactory(min_score=0, max_score=50,
+                                   rotation_start=get_tz_datetime(1990, 1, 1),
+                                   rotation_end=get_tz_datetime(2100, 1, 1))
+
+    def borrower_ids(self, *scores):
+        return {self.borrowers[score].id for score in scores}
+
+    def test_eligible(self):
+        borrower_scores = BorrowerScores.load(chunk_size=2)
+
+        self.assertEqual(len(borrower_scores), 5)
+        self.assertEqual(set(borrower_scores.eligible(100, 500).tolist()), self.borrower_ids(100, 300, 500))
+        self.assertEqual(set(borrower_scores.eligible(501, 1000).tolist()), self.borrower_ids(501))
+        self.assertEqual(borrower_scores.eligible(600, 1000).tolist(), [])
+
+    def test_create_credit_requests_for_offers(self):
+        CreditRequest.objects.create(borrower=self.borrowers[300], offer=self.offer)
+
+        created = create_credit_requests_for_offers(BorrowerScores.load(), [self.offer, self.offer2],
+                                                    batch_size=1)
+
+        self.assertEqual(created, {self.offer.id: 2, self.offer2.id: 1})
+        self.assertEqual(
+            set(CreditRequest.objects.values_list('borrower_id', 'offer_id')),
+            {(borrower_id, self.offer.id) for borrower_id in self.borrower_ids(100, 300, 500)} |
+            {(borrower_id, self.offer2.id) for borrower_id in self.borrower_ids(50)})
+
+    def test_command(self):
+        call_command('match_offers', offer_ids=[self.offer2.id], stdout=StringIO())
+
+        self.assertEqual(list(CreditRequest.objects.values_list('borrower_id', 'offer_id')),
+                         [(self.borrowers[50].id, self.offer2.id)])
+
+
+class OfferRematchPlanTestCase(TestCase):
+
+    def setUp(self):
+        self.now = get_tz_datetime(2010, 6, 1)
+        self.offer = OfferFactory.build(min_score=100, max_score=500,
+                                        rotation_start=get_tz_datetime(2010, 1, 1),
+                                        rotation_end=get_tz_datetime(2011, 1, 1))
+
+    def previous(self, min_score, max_score, rotation_start=None, rotation_end=None):
+        return {
+            'min_score': min_score,
+            'max_score': max_score,
+            'rotation_start': rotation_start or self.offer.rotation_start,
+            'rotation_end': rotation_end or self.offer.rotation_end,
+        }
+
+    def test_subtract_interval(self):
+        self.assertEqual(subtract_interval((100, 500), None), [(100, 500)])
+        self.assertEqual(subtract_interval((100, 500), (200, 300)), [(100, 199), (301, 500)])
+        self.assertEqual(subtract_interval((100, 500), (50, 300)), [(301, 500)])
+        self.assertEqual(subtract_interval((100, 500), (600, 700)), [(100, 500)])
+        self.assertEqual(subtract_interval((100, 500), (0, 1000)), [])
+
+    def test_new_offer(self):
+        self.assertEqual(offer_rematch_plan(None, self.offer, self.now), [(100, 500)])
+
+    def test_widened_active_offer(self):
+        self.assertEqual(offer_rematch_plan(self.previous(200, 400), self.offer, self.now),
+                         [(100, 199), (401, 500)])
+        self.assertEqual(offer_rematch_plan(self.previous(100, 500), self.offer, self.now), [])
+
+    def test_activated_offer(self):
+        previous = self.previous(100, 500, rotation_end=get_tz_datetime(2010, 2, 1))
+        self.assertEqual(offer_rematch_plan(previous, self.offer, self.now), [(100, 500)])
+
+    def test_future_and_expired_rotation(self):
+        """Будущую ротацию подбирает MatchStartedOffersTask"""
+        self.offer.rotation_start = get_tz_datetime(2010, 9, 1)
+        self.assertEqual(offer_rematch_plan(self.previous(100, 500), self.offer, self.now), [])
+
+        self.offer.rotation_end = get_tz_datetime(2010, 3, 1)
+        self.assertEqual(offer_rematch_plan(None, self.offer, self.now), [])
+
+    def test_intersect_interval(self):
+        self.assertEqual(intersect_interval((100, 500), (200, 1000)), (200, 500))
+        self.assertIsNone(intersect_interval((100, 150), (200, 1000)))
+
+    def test_create_credit_requests_for_score_intervals(self):
+        borrowers = {score: BorrowerFactory(score=score) for score in (50, 100, 300, 500)}
+        self.offer = OfferFactory()
+
+        created = create_credit_requests_for_score_intervals(self.offer.id, [(0, 60), (300, 400)],
+                                                             batch_size=1)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(set(CreditRequest.objects.values_list('borrower_id', flat=True)),
+                         {borrowers[50].id, borrowers[300].id})
+        self.assertEqual(create_credit_requests_for_score_intervals(self.offer.id, []), 0)
@@ -0,0 +1,71 @@
+from django.test import TestCase
+
+from credit_project.api.tests.factories import BorrowerFactory, CompanyFactory, CreditRequestFactory, OfferFactory
+from credit_project.loans.models import CreditRequest
+
+
+class CreditRequestOwnerCompaniesTestCase(TestCase):
+
+    def setUp(self):
+        self.borrower = BorrowerFactory()
+        self.offer = OfferFactory()
+
+    def assertOwnerCompanies(self, credit_request):
+        credit_request.refresh_from_db()
+        self.assertEqual(credit_request.borrower_company_id, credit_request.borrower.company_id)
+        self.assertEqual(credit_request.offer_company_id, credit_request.offer.company_id)
+
+    def test_save(self):
+        self.assertOwnerCompanies(CreditRequestFactory(borrower=self.borrower, offer=self.offer))
+
+    def test_save_without_owner_change(self):
+        """Смена статуса не загружает анкету и предложение"""
+        credit_request = CreditRequest.objects.get(id=CreditRequestFactory(borrower=self.borrower, offer=self.offer).id)
+        credit_request.status = CreditRequest.STATUSES.sent
+        with self.assertNumQueries(1):
+            credit_request.save()
+
+        credit_request.offer = OfferFactory()
+        credit_request.save()
+        self.assertOwnerCompanies(credit_request)
+
+    def test_bulk_create(self):
+        """Не переданные компании догружаются одним запросом на модель"""
+        with self.assertNumQueries(3):
+            created_ids = CreditRequest.objects.bulk_create_ignore_conflicts(
+                [CreditRequest(borrower_id=self.borrower.id, offer_id=self.offer.id)])
+        self.assertOwnerCompanies(CreditRequest.objects.get(id=created_ids[0]))
+
+    def test_company_change(self):
+        """Смена компании анкеты или предложения обновляет заявки"""
+        credit_request = CreditRequestFactory(borrower=self.borrower, offer=self.offer)
+
+        self.borrower.company = CompanyFactory()
+        self.borrower.save()
+        self.offer.company = CompanyFactory()
+        self.offer.save()
+        self.assertOwnerCompanies(credit_request)
+
+
+class CreditRequestTransitionTestCase(TestCase):
+
+    def setUp(self):
+        self.credit_request = CreditRequestFactory(status=CreditRequest.STATUSES.received)
+        self.credit_request2 = CreditRequestFactory(status=CreditRequest.STATUSES.new)
+
+    def test_transition(self):
+        """Один UPDATE ... RETURNING, статус проверяется в том же запросе"""
+        ids = [self.credit_request.id, self.credit_request2.id]
+        with self.assertNumQueries(1):
+            updated = CreditRequest.objects.transition(ids, CreditRequest.STATUSES.approved)
+        self.assertEqual(updated, [self.credit_request.id])
+        self.assertEqual(CreditRequest.objects.transition(ids, CreditRequest.STATUSES.approved), [])
+        self.assertEqual(CreditRequest.objects.filter(id=self.credit_request.id).transition(
+            ids, CreditRequest.STATUSES.issued), [self.credit_request.id])
+        self.assertEqual(CreditRequest.objects.transition([], CreditRequest.STATUSES.sent), [])
+
+        self.credit_request.refresh_from_db()
+        self.credit_request2.refresh_from_db()
+        self.assertEqual(self.credit_request.status, CreditRequest.STATUSES.issued)
+        self.assertEqual(self.credit_request2.status, CreditRequest.STATUSES.new)
+        self.assertIsNone(self.credit_request.sent_date)
@@ -0,0 +1,114 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+
+from credit_project.api.tests.factories import OfferFactory
+from credit_project.api.tests.utils import get_tz_datetime
+from credit_project.loans.offer_index import ActiveOfferIndex
+
+
+class ActiveOfferIndexTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.index = ActiveOfferIndex()
+
+        self.offer = OfferFactory(min_score=100, max_score=500,
+                                  rotation_start=get_tz_datetime(2010, 1, 1),
+                                  rotation_end=get_tz_datetime(2011, 1, 1))
+        self.offer2 = OfferFactory(min_score=300, max_score=900,
+                                   rotation_start=get_tz_datetime(2010, 6, 1),
+                                   rotation_end=get_tz_datetime(2012, 1, 1))
+
+    def test_offers_for_score(self):
+        now = get_tz_datetime(2010, 7, 1)
+
+        self.assertEqual(self.index.offers_for_score(50, now), [])
+        self.assertEqual(self.index.offers_for_score(100, now), [self.offer.id])
+        self.assertEqual(set(self.index.offers_for_score(400, now)), {self.offer.id, self.offer2.id})
+        self.assertEqual(self.index.offers_for_score(900, now), [self.offer2.id])
+        self.assertEqual(self.index.offers_for_score(901, now), [])
+
+    def test_newly_eligible_offers(self):
+        now = get_tz_datetime(2010, 7, 1)
+
+        self.assertEqual(self.index.newly_eligible_offers(50, 400, now), [self.offer.id, self.offer2.id])
+        self.assertEqual(self.index.newly_eligible_offers(200, 400, now), [self.offer2.id])
+        self.assertEqual(self.index.newly_eligible_offers(400, 450, now), [])
+        self.assertEqual(self.index.newly_eligible_offers(800, 450, now), [self.offer.id])
+        self.assertEqual(self.index.newly_eligible_offers(1000, 800, now), [self.offer2.id])
+        self.assertEqual(self.index.newly_eligible_offers(400, 400, now), [])
+
+    def test_no_queries_while_fresh(self):
+        self.index.offers_for_score(400, get_tz_datetime(2010, 7, 1))
+
+        with self.assertNumQueries(0):
+            self.index.offers_for_score(400, get_tz_datetime(2010, 8, 1))
+            self.index.offers_for_score(600, get_tz_datetime(2010, 12, 31))
+
+    def test_rebuild_on_rotation_boundary(self):
+        # До начала ротации второго предложения
+        self.assertEqual(self.index.offers_for_score(400, get_tz_datetime(2010, 3, 1)),
+                         [self.offer.id])
+        # Началась ротация второго предложения
+        self.assertEqual(set(self.index.offers_for_score(400, get_tz_datetime(2010, 6, 1))),
+                         {self.offer.id, self.offer2.id})
+        # Закончилась ротация первого
+        self.assertEqual(self.index.offers_for_score(400, get_tz_datetime(2011, 1, 2)),
+                         [self.offer2.id])
+
+    def test_shared_data(self):
+        """Другой процесс берет данные индекса из общего кэша без запросов к БД"""
+        now = get_tz_datetime(2010, 7, 1)
+        self.index.offers_for_score(400, now)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(set(ActiveOfferIndex().offers_for_score(400, now)), {self.offer.id, self.offer2.id})
+
+    def test_rebuild_lock(self):
+        """Пока индекс перестраивает другой процесс, индекс ждет его данных, а не строит их сам"""
+        now = get_tz_datetime(2010, 7, 1)
+        version = self.index._get_version()
+        data = ActiveOfferIndex()._build(now)
+        cache.add(ActiveOfferIndex.REBUILD_LOCK_CACHE_KEY.format(version), True)
+
+        def finish_rebuild(seconds):
+            cache.set(ActiveOfferIndex.DATA_CACHE_KEY.format(version), data)
+
+        with mock.patch('credit_project.loans.offer_index.time.sleep', side_effect=finish_rebuild) as sleep_mock, \
+                self.assertNumQueries(0):
+            self.assertEqual(self.index.offers_for_score(100, now), [self.offer.id])
+        sleep_mock.assert_called_once_with(ActiveOfferIndex.REBUILD_POLL_INTERVAL)
+
+        # Перестройка не закончилась за REBUILD_WAIT - индекс строится сам
+        other_version = 'other'
+        cache.set(ActiveOfferIndex.VERSION_CACHE_KEY, other_version)
+        cache.add(ActiveOfferIndex.REBUILD_LOCK_CACHE_KEY.format(other_version), True)
+        with mock.patch.object(ActiveOfferIndex, 'REBUILD_WAIT', 0):
+            self.assertEqual(self.index.offers_for_score(100, now), [self.offer.id])
+        self.assertIsNone(cache.get(ActiveOfferIndex.DATA_CACHE_KEY.format(other_version)))
+
+
+class ActiveOfferIndexInvalidationTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.index = ActiveOfferIndex()
+
+    @mock.patch('credit_project.loans.tasks.RematchOfferTask.apply_async')
+    @mock.patch('django.utils.timezone.now')
+    def test_invalidate_on_save_and_delete(self, now_mock, apply_async_mock):
+        now = get_tz_datetime(2010, 7, 1)
+        now_mock.return_value = now
+        offer = OfferFactory(min_score=100, max_score=500,
+                             rotation_start=get_tz_datetime(2010, 1, 1),
+                             rotation_end=get_tz_datetime(2011, 1, 1))
+        self.assertEqual(self.index.offers_for_score(600, now), [])
+
+        offer.max_score = 700
+        offer.save()
+        self.assertEqual(self.index.offers_for_score(600, now), [offer.id])
+
+        offer.delete()
+        self.assertEqual(self.index.offers_for_score(600, now), [])
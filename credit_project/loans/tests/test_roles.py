@@ -0,0 +1,41 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from credit_project.api.tests.factories import CompanyFactory, UserFactory
+from credit_project.loans.models import Company
+from credit_project.loans.roles import get_user_role
+
+User = get_user_model()
+
+
+class UserRoleTestCase(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = UserFactory()
+        self.company = CompanyFactory(user=self.user, kind=Company.KIND.partner)
+
+    def test_role_is_cached(self):
+        role = get_user_role(User.objects.get(pk=self.user.pk))
+        self.assertTrue(role.is_partner)
+        self.assertEqual(role.company_id, self.company.id)
+
+        # Новый объект пользователя (следующий запрос) берет компанию из кэша
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_role(user), role)
+            get_user_role(user)
+
+    def test_role_is_invalidated_on_company_change(self):
+        get_user_role(User.objects.get(pk=self.user.pk))
+
+        self.company.kind = Company.KIND.credit_organization
+        self.company.save()
+        role = get_user_role(User.objects.get(pk=self.user.pk))
+        self.assertTrue(role.is_credit_organization)
+
+        self.company.delete()
+        role = get_user_role(User.objects.get(pk=self.user.pk))
+        self.assertFalse(role.has_company)
+        self.assertFalse(role.is_partner)
@@ -0,0 +1,285 @@
+import datetime
+from unittest import mock
+
+from celery.utils import uuid
+from celery_batches import SimpleRequest
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from credit_project.api.tests.factories import BorrowerFactory, OfferFactory
+from credit_project.api.tests.utils import get_tz_datetime
+from credit_project.loans.jobs import FAILURE, create_job, get_job
+from credit_project.loans.models import CreditRequest
+from credit_project.loans.offer_index import offer_index
+from credit_project.loans.tasks import (
+    CreateBorrowersOfferRequestsTask,
+    CreateOfferRequestsBatchTask,
+    CreateOfferRequestsTask,
+    MatchStartedOffersTask,
+    RematchOfferTask,
+)
+
+
+class CreateOfferRequestsTaskTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.borrower = BorrowerFactory(score=300)
+        self.offer = OfferFactory(min_score=100, max_score=500,
+                                  rotation_start=get_tz_datetime(1990, 1, 1),
+                                  rotation_end=get_tz_datetime(2100, 1, 1))
+        self.offer2 = OfferFactory(min_score=200, max_score=400,
+                                   rotation_start=get_tz_datetime(1990, 1, 1),
+                                   rotation_end=get_tz_datetime(2100, 1, 1))
+        # Не подходит по баллу
+        OfferFactory(min_score=400, max_score=500,
+                     rotation_start=get_tz_datetime(1990, 1, 1),
+                     rotation_end=get_tz_datetime(2100, 1, 1))
+
+    def test_create_for_matching_offers(self):
+        created = CreateOfferRequestsTask().run(borrower_id=self.borrower.id)
+
+        self.assertEqual(created, 2)
+        self.assertEqual(
+            set(CreditRequest.objects.values_list('offer_id', flat=True)),
+            {self.offer.id, self.offer2.id})
+
+    def test_create_for_offer(self):
+        created = CreateOfferRequestsTask().run(borrower_id=self.borrower.id, offer_id=self.offer.id)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('offer_id', flat=True)),
+                         [self.offer.id])
+
+    def test_create_for_offer_ids(self):
+        created = CreateOfferRequestsTask().run(borrower_id=self.borrower.id,
+                                                offer_ids=[self.offer2.id, 0])
+
+        self.assertEqual(created, 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('offer_id', flat=True)),
+                         [self.offer2.id])
+
+    def test_retry_does_not_create_duplicates(self):
+        CreateOfferRequestsTask().run(borrower_id=self.borrower.id, offer_id=self.offer.id)
+
+        created = CreateOfferRequestsTask().run(borrower_id=self.borrower.id)
+
+        self.assertEqual(created, 1)
+        self.assertEqual(CreditRequest.objects.count(), 2)
+        self.assertEqual(CreateOfferRequestsTask().run(borrower_id=self.borrower.id), 0)
+        self.assertEqual(CreditRequest.objects.count(), 2)
+
+    def test_failure_finishes_job(self):
+        """Упавшая задача помечает задание неуспешным, и повтор по тому же ключу создает новое"""
+        claim_keys = [('claim', 60)]
+        job_id, _ = create_job(user_id=None, claim_keys=claim_keys)
+        # Бэкенд результатов в тестах не настроен
+        with mock.patch.object(CreateOfferRequestsTask, 'create_credit_requests', side_effect=RuntimeError), \
+                mock.patch.object(CreateOfferRequestsTask, 'backend'):
+            result = CreateOfferRequestsTask().apply(args=(self.borrower.id, None, None, job_id))
+
+        self.assertTrue(result.failed())
+        self.assertEqual(get_job(job_id)['state'], FAILURE)
+        new_job_id, created = create_job(user_id=None, claim_keys=claim_keys)
+        self.assertTrue(created)
+        self.assertNotEqual(new_job_id, job_id)
+
+
+class CreateBorrowersOfferRequestsTaskTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.borrower = BorrowerFactory(score=300)
+        self.borrower2 = BorrowerFactory(score=150)
+        self.offer = OfferFactory(min_score=100, max_score=500,
+                                  rotation_start=get_tz_datetime(1990, 1, 1),
+                                  rotation_end=get_tz_datetime(2100, 1, 1))
+        self.offer2 = OfferFactory(min_score=200, max_score=400,
+                                   rotation_start=get_tz_datetime(1990, 1, 1),
+                                   rotation_end=get_tz_datetime(2100, 1, 1))
+
+    def test_create(self):
+        created = CreateBorrowersOfferRequestsTask().run(borrower_ids=[self.borrower.id, self.borrower2.id])
+
+        self.assertEqual(created, 3)
+        self.assertEqual(
+            set(CreditRequest.objects.values_list('borrower_id', 'offer_id', 'offer_company_id')),
+            {(self.borrower.id, self.offer.id, self.offer.company_id),
+             (self.borrower.id, self.offer2.id, self.offer2.company_id),
+             (self.borrower2.id, self.offer.id, self.offer.company_id)})
+        self.assertEqual(CreateBorrowersOfferRequestsTask().run(borrower_ids=[self.borrower.id]), 0)
+
+    def test_index_rebuilt_after_company_snapshot(self):
+        with mock.patch.object(offer_index, 'company_ids', return_value={}):
+            created = CreateBorrowersOfferRequestsTask().run(borrower_ids=[self.borrower2.id])
+
+        self.assertEqual(created, 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('offer_id', 'offer_company_id')),
+                         [(self.offer.id, self.offer.company_id)])
+
+
+class CreateOfferRequestsBatchTaskTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.borrower = BorrowerFactory(score=300)
+        self.borrower2 = BorrowerFactory(score=450)
+        self.offer = OfferFactory(min_score=100, max_score=500,
+                                  rotation_start=get_tz_datetime(1990, 1, 1),
+                                  rotation_end=get_tz_datetime(2100, 1, 1))
+        self.offer2 = OfferFactory(min_score=200, max_score=400,
+                                   rotation_start=get_tz_datetime(1990, 1, 1),
+                                   rotation_end=get_tz_datetime(2100, 1, 1))
+
+    def make_request(self, *args, **kwargs):
+        return SimpleRequest(uuid(), CreateOfferRequestsBatchTask.name, args, kwargs, {}, 'localhost')
+
+    def test_batch(self):
+        requests = [
+            self.make_request(borrower_id=self.borrower.id, offer_id=None),
+            self.make_request(self.borrower2.id),
+            self.make_request(borrower_id=self.borrower2.id, offer_id=self.offer.id),
+            self.make_request(borrower_id=0, offer_id=None),
+            self.make_request(borrower_id=self.borrower.id, offer_ids=[self.offer.id, 0]),
+        ]
+
+        offer_index.offers_for_score(0)
+
+        # Анкеты, предложения и один INSERT, плюс SAVEPOINT/RELEASE внутри тестовой транзакции
+        with self.assertNumQueries(5):
+            created = CreateOfferRequestsBatchTask().run(requests)
+
+        self.assertEqual(created, 3)
+        self.assertEqual(
+            set(CreditRequest.objects.values_list('borrower_id', 'offer_id')),
+            {(self.borrower.id, self.offer.id),
+             (self.borrower.id, self.offer2.id),
+             (self.borrower2.id, self.offer.id)})
+
+    def test_index_rebuilt_after_company_snapshot(self):
+        """Предложения, которых нет в снимке компаний (индекс перестроен при подборе), не роняют пачку"""
+        with mock.patch.object(offer_index, 'company_ids', return_value={}):
+            created = CreateOfferRequestsBatchTask().run([self.make_request(self.borrower.id)])
+
+        self.assertEqual(created, 2)
+        self.assertEqual(
+            set(CreditRequest.objects.values_list('offer_id', 'offer_company_id')),
+            {(self.offer.id, self.offer.company_id), (self.offer2.id, self.offer2.company_id)})
+
+    def test_batch_jobs(self):
+        """Результат каждого сообщения записывается в его задание"""
+        job_ids = [create_job(user_id=None)[0] for _ in range(3)]
+        requests = [
+            self.make_request(borrower_id=self.borrower.id, job_id=job_ids[0]),
+            self.make_request(self.borrower2.id, self.offer.id, None, job_ids[1]),
+            self.make_request(borrower_id=0, job_id=job_ids[2]),
+        ]
+
+        CreateOfferRequestsBatchTask().run(requests)
+
+        self.assertEqual(get_job(job_ids[0])['ids'], sorted(CreditRequest.objects.filter(
+            borrower=self.borrower).values_list('id', flat=True)))
+        self.assertEqual(get_job(job_ids[0])['created'], 2)
+        self.assertEqual(get_job(job_ids[1])['ids'], list(CreditRequest.objects.filter(
+            borrower=self.borrower2).values_list('id', flat=True)))
+        self.assertEqual(get_job(job_ids[2])['state'], FAILURE)
+
+    def test_batch_failure_finishes_jobs(self):
+        job_ids = [create_job(user_id=None)[0] for _ in range(2)]
+        requests = [self.make_request(borrower_id=self.borrower.id, job_id=job_id) for job_id in job_ids]
+
+        with mock.patch.object(CreditRequest.objects, 'bulk_create_ignore_conflicts', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                CreateOfferRequestsBatchTask().run(requests)
+
+        self.assertEqual([get_job(job_id)['state'] for job_id in job_ids], [FAILURE, FAILURE])
+
+
+class RematchOfferTaskTestCase(TestCase):
+
+    def setUp(self):
+        self.borrower = BorrowerFactory(score=300)
+        self.offer = OfferFactory(min_score=100, max_score=500,
+                                  rotation_start=get_tz_datetime(1990, 1, 1),
+                                  rotation_end=get_tz_datetime(2100, 1, 1))
+
+    def test_rematch(self):
+        created = RematchOfferTask().run(self.offer.id, [[200, 400]])
+
+        self.assertEqual(created, 1)
+        self.assertTrue(CreditRequest.objects.filter(borrower=self.borrower, offer=self.offer).exists())
+
+    def test_resaved_offer(self):
+        """Повторное сохранение не отменяет подбор, интервалы обрезаются по текущим границам"""
+        BorrowerFactory(score=150)
+        self.offer.name = 'renamed'
+        self.offer.min_score = 200
+        self.offer.save()
+
+        self.assertEqual(RematchOfferTask().run(self.offer.id, [[100, 400]], 'outdated'), 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('borrower_id', flat=True)), [self.borrower.id])
+
+        self.offer.rotation_end = get_tz_datetime(2000, 1, 1)
+        self.offer.save()
+        self.assertEqual(RematchOfferTask().run(self.offer.id, [[100, 400]]), 0)
+
+
+class MatchStartedOffersTaskTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.borrower = BorrowerFactory(score=300)
+
+    def test_match_started_offers(self):
+        now = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=now - datetime.timedelta(hours=1)):
+            started = OfferFactory(min_score=100, max_score=500, rotation_start=now - datetime.timedelta(minutes=1),
+                                   rotation_end=now + datetime.timedelta(days=1))
+            future = OfferFactory(min_score=100, max_score=500, rotation_start=now + datetime.timedelta(days=1),
+                                  rotation_end=now + datetime.timedelta(days=2))
+
+        self.assertEqual(MatchStartedOffersTask().run(), 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('offer_id', flat=True)), [started.id])
+
+        # Следующий запуск подбирает только предложения, ротация которых началась после предыдущего
+        CreditRequest.objects.all().delete()
+        self.assertEqual(MatchStartedOffersTask().run(), 0)
+        with mock.patch('django.utils.timezone.now', return_value=future.rotation_start):
+            self.assertEqual(MatchStartedOffersTask().run(), 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('offer_id', flat=True)), [future.id])
+
+    def test_offer_saved_after_rotation_start(self):
+        """Предложение, измененное после начала ротации, но до запуска задачи, тоже подбирается"""
+        now = timezone.now()
+        with mock.patch('django.utils.timezone.now', return_value=now - datetime.timedelta(hours=1)):
+            offer = OfferFactory(min_score=100, max_score=500, rotation_start=now - datetime.timedelta(minutes=2),
+                                 rotation_end=now + datetime.timedelta(days=1))
+        with mock.patch('django.utils.timezone.now', return_value=now - datetime.timedelta(minutes=1)):
+            offer.name = 'Новое название'
+            offer.save()
+
+        self.assertEqual(MatchStartedOffersTask().run(), 1)
+        self.assertEqual(list(CreditRequest.objects.values_list('offer_id', flat=True)), [offer.id])
+
+
+class RematchOfferOnSaveTestCase(TransactionTestCase):
+
+    @mock.patch('credit_project.loans.tasks.RematchOfferTask.apply_async')
+    def test_enqueue_new_intervals(self, apply_async_mock):
+        offer = OfferFactory(min_score=100, max_score=500,
+                             rotation_start=get_tz_datetime(1990, 1, 1),
+                             rotation_end=get_tz_datetime(2100, 1, 1))
+        apply_async_mock.assert_called_once_with(
+            None, {'offer_id': offer.id, 'intervals': [(100, 500)]}, producer=mock.ANY)
+
+        apply_async_mock.reset_mock()
+        offer.max_score = 600
+        offer.save()
+        apply_async_mock.assert_called_once_with(
+            None, {'offer_id': offer.id, 'intervals': [(501, 600)]}, producer=mock.ANY)
+
+        apply_async_mock.reset_mock()
+        offer.max_score = 400
+        offer.save()
+        apply_async_mock.assert_not_called()
@@ -0,0 +1,60 @@
+"""Постановка задач Celery в очередь после коммита транзакции.
+
+Запросы API выполняются в транзакции (ATOMIC_REQUESTS), поэтому задача, отправленная
+из запроса напрямую, может попасть к воркеру раньше коммита и не увидеть данных.
+enqueue откладывает отправку каждого сообщения до коммита через transaction.on_commit:
+при откате транзакции ничего не отправляется, а сообщения, поставленные в откаченном
+savepoint, Django отбрасывает вместе с ним.
+
+Сообщения транзакции отправляются одно за другим при коммите через пул соединений
+с брокером (app.producer_or_acquire), поэтому новое соединение на каждое сообщение не открывается.
+"""
+import logging
+
+from django.db import transaction
+
+from .celery import app
+
+logger = logging.getLogger(__name__)
+
+
+class Message:
+
+    def __init__(self, task, args, kwargs, options, on_error=None):
+        self.task = task
+        self.args = args
+        self.kwargs = kwargs
+        self.options = options
+        self.on_error = on_error
+
+    def publish(self):
+        publish([self])
+
+
+def publish(messages):
+    """Отправляет сообщения через одно соединение с брокером.
+    Ошибка отправки одного сообщения не мешает отправке остальных: она логируется,
+    и вызывается on_error сообщения.
+    """
+    if not messages:
+        return
+    with app.producer_or_acquire() as producer:
+        for message in messages:
+            try:
+                message.task.apply_async(message.args, message.kwargs, producer=producer, **message.options)
+            except Exception:
+                logger.exception('Не удалось отправить задачу {}.'.format(message.task.name))
+                if message.on_error is not None:
+                    message.on_error()
+
+
+def enqueue(task, args=None, kwargs=None, using=None, on_error=None, **options):
+    """Ставит задачу в очередь после коммита текущей транзакции (аргументы - как у apply_async).
+    Вне транзакции задача отправляется сразу.
+
+    К моменту отправки запрос уже мог вернуть ответ, поэтому ошибка брокера не пробрасывается.
+    on_error - функция без аргументов, которая вызывается, если задачу отправить не удалось
+    (например, чтобы пометить задание как неуспешное).
+    """
+    message = Message(task, args, kwargs, options, on_error)
+    transaction.on_commit(message.publish, using=using)